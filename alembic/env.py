@@ -4,10 +4,15 @@ from sqlalchemy import pool
 from backend.db import Base, DATABASE_URL
 
 import backend.models.user
-import backend.models.message
+import backend.models.call_session
 import backend.models.participant
 import backend.models.signaling
-import backend.models.call_session
+import backend.models.message
+import backend.models.message_archive
+import backend.models.conversation
+import backend.models.group
+import backend.models.GroupMember
+import backend.models.group_message
 
 from alembic import context
 
@@ -0,0 +1,40 @@
+"""cascade participants with their call session
+
+Revision ID: 14c00cfb4964
+Revises: 19db6f97262c
+Create Date: 2026-10-19 16:34:52.606113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '14c00cfb4964'
+down_revision: Union[str, None] = '19db6f97262c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The swap commits with the constraint NOT VALID, so the locks taken by DROP
+# and ADD are held only briefly; validation then runs in its own
+# transaction under SHARE UPDATE EXCLUSIVE and does not block writes.
+def upgrade() -> None:
+    op.drop_constraint("participants_call_id_fkey", "participants", type_="foreignkey")
+    op.execute(
+        "ALTER TABLE participants ADD CONSTRAINT participants_call_id_fkey "
+        "FOREIGN KEY (call_id) REFERENCES call_session (id) ON DELETE CASCADE NOT VALID"
+    )
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TABLE participants VALIDATE CONSTRAINT participants_call_id_fkey")
+
+
+def downgrade() -> None:
+    op.drop_constraint("participants_call_id_fkey", "participants", type_="foreignkey")
+    op.execute(
+        "ALTER TABLE participants ADD CONSTRAINT participants_call_id_fkey "
+        "FOREIGN KEY (call_id) REFERENCES call_session (id) NOT VALID"
+    )
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TABLE participants VALIDATE CONSTRAINT participants_call_id_fkey")
@@ -0,0 +1,40 @@
+"""add group catalog indexes
+
+Revision ID: 19db6f97262c
+Revises: 71d2ad21b262
+Create Date: 2026-10-19 16:21:09.418237
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '19db6f97262c'
+down_revision: Union[str, None] = '71d2ad21b262'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_groups_creator_id", "groups", ["creator_id"]),
+    ("ix_group_members_group_status", "group_members", ["group_id", "status", "id"]),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_groups_name_c_id '
+            'ON groups ((name COLLATE "C"), id)'
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_groups_name_c_id", table_name="groups", postgresql_concurrently=True, if_exists=True)
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
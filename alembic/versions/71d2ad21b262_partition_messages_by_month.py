@@ -0,0 +1,179 @@
+"""partition messages by month and add message archive
+
+Revision ID: 71d2ad21b262
+Revises: 7f6c1021ca44
+Create Date: 2026-10-19 11:02:47.113905
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '71d2ad21b262'
+down_revision: Union[str, None] = '7f6c1021ca44'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MESSAGE_INDEXES = [
+    ("ix_messages_id", ["id"]),
+    ("ix_messages_receiver_status_sender", ["receiver_id", "status", "sender_id"]),
+    ("ix_messages_sender_receiver_timestamp", ["sender_id", "receiver_id", "timestamp"]),
+    ("ix_messages_receiver_change_seq", ["receiver_id", "change_seq"]),
+    ("ix_messages_sender_change_seq", ["sender_id", "change_seq"]),
+]
+MONTHS_AHEAD = 3
+
+
+def month_start(value: datetime, offset: int = 0) -> datetime:
+    month = value.year * 12 + value.month - 1 + offset
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+# The existing table becomes the first partition (everything before next
+# month), so no rows are copied. Each step that would scan it under an
+# exclusive lock is prepared with a concurrent index or a NOT VALID
+# constraint, validated after a commit so the scan only holds a SHARE UPDATE
+# EXCLUSIVE lock and writes go on.
+def upgrade() -> None:
+    boundary = month_start(datetime.utcnow(), 1)
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS messages_legacy_id_timestamp "
+            "ON messages (id, timestamp)"
+        )
+
+    op.execute("UPDATE messages SET timestamp = now() AT TIME ZONE 'utc' WHERE timestamp IS NULL")
+    op.execute("ALTER TABLE messages ADD CONSTRAINT messages_timestamp_not_null CHECK (timestamp IS NOT NULL) NOT VALID")
+    op.execute(
+        f"ALTER TABLE messages ADD CONSTRAINT messages_legacy_range "
+        f"CHECK (timestamp < '{boundary.isoformat()}') NOT VALID"
+    )
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TABLE messages VALIDATE CONSTRAINT messages_timestamp_not_null")
+        op.execute("ALTER TABLE messages VALIDATE CONSTRAINT messages_legacy_range")
+
+    # Both use the validated constraints instead of scanning.
+    op.execute("ALTER TABLE messages ALTER COLUMN timestamp SET NOT NULL")
+    op.execute("ALTER TABLE messages DROP CONSTRAINT messages_timestamp_not_null")
+
+    op.drop_constraint("conversations_last_message_id_fkey", "conversations", type_="foreignkey")
+
+    op.execute("ALTER TABLE messages RENAME TO messages_legacy")
+    op.execute("ALTER TABLE messages_legacy RENAME CONSTRAINT messages_pkey TO messages_legacy_pkey")
+    for name, _ in MESSAGE_INDEXES:
+        op.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_legacy")
+
+    op.execute(
+        """
+        CREATE TABLE messages (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+            sender_id INTEGER REFERENCES users (id),
+            receiver_id INTEGER REFERENCES users (id),
+            content VARCHAR,
+            content_bin BYTEA,
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            status VARCHAR,
+            change_seq BIGINT DEFAULT nextval('message_change_seq'),
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+        """
+    )
+    # The sequence must outlive the legacy partition once it is archived.
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.execute(
+        f"ALTER TABLE messages ATTACH PARTITION messages_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{boundary.isoformat()}')"
+    )
+    op.execute("ALTER TABLE messages_legacy DROP CONSTRAINT messages_legacy_range")
+
+    # Matching indexes already on messages_legacy are attached, not rebuilt.
+    for name, columns in MESSAGE_INDEXES:
+        op.create_index(name, "messages", columns)
+
+    start = boundary
+    for _ in range(MONTHS_AHEAD):
+        upper = month_start(start, 1)
+        op.execute(
+            f"CREATE TABLE messages_{start:%Y_%m} PARTITION OF messages "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        start = upper
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+
+    op.create_table(
+        "message_archive",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_a_id", sa.Integer(), nullable=False),
+        sa.Column("user_b_id", sa.Integer(), nullable=False),
+        sa.Column("first_message_id", sa.Integer(), nullable=False),
+        sa.Column("last_message_id", sa.Integer(), nullable=False),
+        sa.Column("message_count", sa.Integer(), nullable=False),
+        sa.Column("payload", sa.LargeBinary(), nullable=False),
+        sa.Column("archived_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_message_archive_id", "message_archive", ["id"])
+    op.create_index(
+        "ix_message_archive_pair_last_id",
+        "message_archive",
+        ["user_a_id", "user_b_id", "last_message_id"],
+    )
+
+
+# Folds the partitions back into one table, for databases that have not
+# archived anything yet: messages_legacy becomes messages again and the rows
+# written since the upgrade are copied into it.
+def downgrade() -> None:
+    conn = op.get_bind()
+    archived = conn.execute(sa.text("SELECT EXISTS (SELECT 1 FROM message_archive)")).scalar()
+    legacy = conn.execute(sa.text("SELECT to_regclass('messages_legacy') IS NOT NULL")).scalar()
+    if archived or not legacy:
+        raise NotImplementedError(
+            "Messages have been archived; archived partitions are no longer "
+            "in the database and cannot be folded back automatically."
+        )
+
+    op.drop_index("ix_message_archive_pair_last_id", table_name="message_archive")
+    op.drop_index("ix_message_archive_id", table_name="message_archive")
+    op.drop_table("message_archive")
+
+    partitions = conn.execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'messages'::regclass"
+    )).scalars().all()
+    for name in partitions:
+        op.execute(f"ALTER TABLE messages DETACH PARTITION {name}")
+    for name in partitions:
+        if name == "messages_legacy":
+            continue
+        op.execute(
+            f"INSERT INTO messages_legacy (id, sender_id, receiver_id, content, content_bin, timestamp, status, change_seq) "
+            f"SELECT id, sender_id, receiver_id, content, content_bin, timestamp, status, change_seq FROM {name}"
+        )
+        op.execute(f"DROP TABLE {name}")
+
+    # Dropping the partitioned table would take the id sequence with it.
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages_legacy.id")
+    op.execute("DROP TABLE messages")
+
+    op.execute("ALTER TABLE messages_legacy RENAME TO messages")
+    op.execute("ALTER TABLE messages RENAME CONSTRAINT messages_legacy_pkey TO messages_pkey")
+    for name, _ in MESSAGE_INDEXES:
+        op.execute(f"ALTER INDEX IF EXISTS {name}_legacy RENAME TO {name}")
+    # Detaching may leave the (id, timestamp) index backing a constraint.
+    op.execute("ALTER TABLE messages DROP CONSTRAINT IF EXISTS messages_legacy_id_timestamp")
+    op.execute("DROP INDEX IF EXISTS messages_legacy_id_timestamp")
+    op.execute("ALTER TABLE messages ALTER COLUMN timestamp DROP NOT NULL")
+
+    op.execute(
+        "ALTER TABLE conversations ADD CONSTRAINT conversations_last_message_id_fkey "
+        "FOREIGN KEY (last_message_id) REFERENCES messages (id) ON DELETE SET NULL NOT VALID"
+    )
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TABLE conversations VALIDATE CONSTRAINT conversations_last_message_id_fkey")
@@ -0,0 +1,58 @@
+"""add hot path indexes
+
+Revision ID: 7f6c1021ca44
+Revises: e6a071d9b1d1
+Create Date: 2026-10-19 10:17:26.550871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f6c1021ca44'
+down_revision: Union[str, None] = 'e6a071d9b1d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_messages_receiver_status_sender", "messages", ["receiver_id", "status", "sender_id"]),
+    ("ix_messages_sender_receiver_timestamp", "messages", ["sender_id", "receiver_id", "timestamp"]),
+    ("ix_messages_receiver_change_seq", "messages", ["receiver_id", "change_seq"]),
+    ("ix_messages_sender_change_seq", "messages", ["sender_id", "change_seq"]),
+    ("ix_group_members_user_status", "group_members", ["user_id", "status"]),
+    ("ix_users_confirmation_token", "users", ["confirmation_token"]),
+]
+
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction, so every index
+# is built in an autocommit block and does not lock writes to the table.
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(
+            "unique_participant_per_call",
+            "participants",
+            ["call_id", "user_id"],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+    constraints = sa.inspect(op.get_bind()).get_unique_constraints("participants")
+    if not any(c["name"] == "unique_participant_per_call" for c in constraints):
+        op.execute(
+            "ALTER TABLE participants ADD CONSTRAINT unique_participant_per_call "
+            "UNIQUE USING INDEX unique_participant_per_call"
+        )
+
+
+def downgrade() -> None:
+    op.drop_constraint("unique_participant_per_call", "participants", type_="unique")
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,135 @@
+"""create base tables
+
+Revision ID: a8d34baa41c3
+Revises: c26531e26f19
+Create Date: 2026-10-19 10:12:03.418265
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d34baa41c3'
+down_revision: Union[str, None] = 'c26531e26f19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Databases created with init_db.py already have some of these tables, so
+# each one is only created when it is missing.
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("username", sa.String(), nullable=True),
+            sa.Column("password_hash", sa.String(), nullable=True),
+            sa.Column("email", sa.String(), nullable=True),
+            sa.Column("public_key", sa.String(), nullable=True),
+            sa.Column("email_confirmed", sa.Boolean(), nullable=True),
+            sa.Column("confirmation_token", sa.String(), nullable=True),
+            sa.Column("status", sa.String(length=20), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if not inspector.has_table("call_session"):
+        op.create_table(
+            "call_session",
+            sa.Column("id", sa.String(), nullable=False),
+            sa.Column("session_key", sa.String(), nullable=False),
+            sa.Column("creator", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_call_session_id", "call_session", ["id"])
+        op.create_index("ix_call_session_creator", "call_session", ["creator"])
+
+    if not inspector.has_table("participants"):
+        op.create_table(
+            "participants",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("call_id", sa.String(), nullable=True),
+            sa.Column("user_id", sa.String(), nullable=True),
+            sa.Column("joined_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["call_id"], ["call_session.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_participants_id", "participants", ["id"])
+        op.create_index("ix_participants_user_id", "participants", ["user_id"])
+
+    if not inspector.has_table("signaling_data"):
+        op.create_table(
+            "signaling_data",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("call_id", sa.String(), nullable=True),
+            sa.Column("sender", sa.String(), nullable=True),
+            sa.Column("target_user", sa.String(), nullable=True),
+            sa.Column("type", sa.String(), nullable=True),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_signaling_data_id", "signaling_data", ["id"])
+        op.create_index("ix_signaling_data_call_id", "signaling_data", ["call_id"])
+        op.create_index("ix_signaling_data_sender", "signaling_data", ["sender"])
+        op.create_index("ix_signaling_data_target_user", "signaling_data", ["target_user"])
+
+    if not inspector.has_table("messages"):
+        op.create_table(
+            "messages",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("sender_id", sa.Integer(), nullable=True),
+            sa.Column("receiver_id", sa.Integer(), nullable=True),
+            sa.Column("content", sa.String(), nullable=True),
+            sa.Column("timestamp", sa.DateTime(), nullable=True),
+            sa.Column("status", sa.String(), nullable=True),
+            sa.ForeignKeyConstraint(["sender_id"], ["users.id"]),
+            sa.ForeignKeyConstraint(["receiver_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_messages_id", "messages", ["id"])
+
+    if not inspector.has_table("groups"):
+        op.create_table(
+            "groups",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("creator_id", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["creator_id"], ["users.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_groups_id", "groups", ["id"])
+
+    if not inspector.has_table("group_members"):
+        op.create_table(
+            "group_members",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("group_id", sa.Integer(), nullable=True),
+            sa.Column("user_id", sa.Integer(), nullable=True),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("joined_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["group_id"], ["groups.id"], ondelete="CASCADE"),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("group_id", "user_id", name="unique_member_per_group"),
+            sa.CheckConstraint("status IN ('joined', 'invited', 'pending')", name="valid_member_status"),
+        )
+        op.create_index("ix_group_members_id", "group_members", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("group_members")
+    op.drop_table("groups")
+    op.drop_table("messages")
+    op.drop_table("signaling_data")
+    op.drop_table("participants")
+    op.drop_table("call_session")
+    op.drop_table("users")
@@ -0,0 +1,153 @@
+"""add conversations, group messages and message sync columns
+
+Revision ID: e6a071d9b1d1
+Revises: a8d34baa41c3
+Create Date: 2026-10-19 10:14:41.902113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6a071d9b1d1'
+down_revision: Union[str, None] = 'a8d34baa41c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_BATCH = 10000
+
+
+# Existing rows get their change sequence in id order.
+def backfill_change_seq() -> None:
+    conn = op.get_bind()
+    while True:
+        result = conn.execute(
+            sa.text(
+                """
+                UPDATE messages SET change_seq = numbered.seq
+                FROM (
+                    SELECT id, nextval('message_change_seq') AS seq
+                    FROM (
+                        SELECT id FROM messages WHERE change_seq IS NULL ORDER BY id LIMIT :batch
+                    ) AS pending
+                ) AS numbered
+                WHERE messages.id = numbered.id
+                """
+            ),
+            {"batch": BACKFILL_BATCH},
+        )
+        if result.rowcount < BACKFILL_BATCH:
+            break
+
+
+# Walks messages in id ranges; each batch upserts the newest message per
+# pair it contains, so a pair seen in several batches keeps the newest one.
+def backfill_conversations() -> None:
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        upper = conn.execute(
+            sa.text(
+                "SELECT max(id) FROM (SELECT id FROM messages WHERE id > :last_id ORDER BY id LIMIT :batch) AS ids"
+            ),
+            {"last_id": last_id, "batch": BACKFILL_BATCH},
+        ).scalar()
+        if upper is None:
+            break
+        conn.execute(
+            sa.text(
+                """
+                INSERT INTO conversations (user_a_id, user_b_id, last_message_id, last_message_at)
+                SELECT DISTINCT ON (LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id))
+                    LEAST(sender_id, receiver_id),
+                    GREATEST(sender_id, receiver_id),
+                    id,
+                    COALESCE(timestamp, now())
+                FROM messages
+                WHERE id > :last_id AND id <= :upper
+                    AND sender_id IS NOT NULL AND receiver_id IS NOT NULL
+                ORDER BY LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id), timestamp DESC, id DESC
+                ON CONFLICT (user_a_id, user_b_id) DO UPDATE
+                SET last_message_id = excluded.last_message_id, last_message_at = excluded.last_message_at
+                WHERE (conversations.last_message_at, conversations.last_message_id)
+                    < (excluded.last_message_at, excluded.last_message_id)
+                """
+            ),
+            {"last_id": last_id, "upper": upper},
+        )
+        last_id = upper
+
+
+def upgrade() -> None:
+    op.execute("CREATE SEQUENCE IF NOT EXISTS message_change_seq")
+    op.add_column("messages", sa.Column("content_bin", sa.LargeBinary(), nullable=True))
+    op.add_column("messages", sa.Column("change_seq", sa.BigInteger(), nullable=True))
+
+    op.add_column(
+        "group_members",
+        sa.Column("last_read_message_id", sa.Integer(), server_default="0", nullable=False),
+    )
+
+    op.create_table(
+        "conversations",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_a_id", sa.Integer(), nullable=False),
+        sa.Column("user_b_id", sa.Integer(), nullable=False),
+        sa.Column("last_message_id", sa.Integer(), nullable=True),
+        sa.Column("last_message_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_a_id"], ["users.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_b_id"], ["users.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["last_message_id"], ["messages.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("user_a_id", "user_b_id", name="unique_conversation_pair"),
+        sa.CheckConstraint("user_a_id <= user_b_id", name="ordered_conversation_pair"),
+    )
+    op.create_index("ix_conversations_id", "conversations", ["id"])
+    op.create_index("ix_conversations_user_a_recent", "conversations", ["user_a_id", "last_message_at", "id"])
+    op.create_index("ix_conversations_user_b_recent", "conversations", ["user_b_id", "last_message_at", "id"])
+    op.create_table(
+        "group_messages",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("group_id", sa.Integer(), nullable=False),
+        sa.Column("sender_id", sa.Integer(), nullable=False),
+        sa.Column("content", sa.String(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["group_id"], ["groups.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["sender_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_group_messages_id", "group_messages", ["id"])
+    op.create_index("ix_group_messages_group_id_id", "group_messages", ["group_id", "id"])
+
+    # Duplicate participants predate the unique constraint added in the next
+    # revision; keep the oldest row of each pair.
+    op.execute(
+        """
+        DELETE FROM participants AS p
+        USING participants AS q
+        WHERE p.call_id = q.call_id AND p.user_id = q.user_id AND p.id > q.id
+        """
+    )
+
+    # The schema changes above commit before the backfill, so messages is
+    # only locked while its columns are added, not for the whole run. The
+    # backfill commits one batch at a time.
+    with op.get_context().autocommit_block():
+        backfill_change_seq()
+        backfill_conversations()
+        op.alter_column("messages", "change_seq", server_default=sa.text("nextval('message_change_seq')"))
+        # Rows written before the default was set.
+        backfill_change_seq()
+
+
+def downgrade() -> None:
+    op.drop_table("group_messages")
+    op.drop_table("conversations")
+    op.drop_column("group_members", "last_read_message_id")
+    op.drop_column("messages", "change_seq")
+    op.drop_column("messages", "content_bin")
+    op.execute("DROP SEQUENCE IF EXISTS message_change_seq")
@@ -0,0 +1,19 @@
+# archive_messages.py
+import asyncio
+
+from backend.message_archive import archive_old_partitions, ensure_message_partitions
+from backend.sharding import message_shards
+
+# Run daily (e.g. from cron): keeps monthly partitions created ahead of time
+# and moves partitions older than MESSAGE_HOT_MONTHS into message_archive,
+# on every message shard.
+async def main():
+    for shard_engine in message_shards.engines:
+        for name in await ensure_message_partitions(bind=shard_engine):
+            print(f"🗄️  Partition {name} ready")
+        for name, count in (await archive_old_partitions(bind=shard_engine)).items():
+            print(f"📦  Archived {count} messages from {name}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    print("✅  Done.")
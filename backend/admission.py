@@ -0,0 +1,100 @@
+# backend/admission.py
+import asyncio
+import heapq
+import itertools
+import os
+
+from fastapi.responses import JSONResponse
+
+from backend.db import DB_POOL_CAPACITY
+
+# Requests are admitted against the database pool's capacity instead of
+# queueing inside SQLAlchemy until the pool times out. Each priority may
+# fill only its share of the pool; high-priority routes can use all of it
+# and are woken first when a slot frees.
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() in ("1", "true", "yes")
+ADMISSION_NORMAL_SHARE = float(os.getenv("ADMISSION_NORMAL_SHARE", "0.8"))
+ADMISSION_LOW_SHARE = float(os.getenv("ADMISSION_LOW_SHARE", "0.5"))
+# How long a high or normal priority request waits for a slot before 503.
+ADMISSION_WAIT_MS = int(os.getenv("ADMISSION_WAIT_MS", "1000"))
+
+HIGH, NORMAL, LOW = 0, 1, 2
+
+HIGH_PRIORITY_PREFIXES = ("/signaling", "/calls", "/auth")
+# Bulk reads that are shed at once rather than queued.
+LOW_PRIORITY_PATHS = ("/users/", "/groups/all")
+# Long-lived streams give their connection back before streaming.
+EXEMPT_PREFIXES = ("/events/", "/docs", "/openapi.json")
+
+
+def route_priority(method: str, path: str) -> int:
+    if path.startswith(HIGH_PRIORITY_PREFIXES):
+        return HIGH
+    if method == "GET" and path in LOW_PRIORITY_PATHS:
+        return LOW
+    return NORMAL
+
+
+class AdmissionController:
+    def __init__(self, capacity: int = DB_POOL_CAPACITY, normal_share: float = ADMISSION_NORMAL_SHARE,
+                 low_share: float = ADMISSION_LOW_SHARE, wait_ms: int = ADMISSION_WAIT_MS):
+        self.limits = {
+            HIGH: capacity,
+            NORMAL: max(1, int(capacity * normal_share)),
+            LOW: max(1, int(capacity * low_share)),
+        }
+        self.wait = wait_ms / 1000
+        self.in_flight = 0
+        self._waiters = []
+        self._seq = itertools.count()
+
+    async def acquire(self, priority: int) -> bool:
+        if self.in_flight < self.limits[priority] and not self._waiting_before(priority):
+            self.in_flight += 1
+            return True
+        if priority == LOW:
+            return False
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            # A timed-out waiter's future is cancelled and skipped on wake.
+            return await asyncio.wait_for(future, self.wait)
+        except asyncio.TimeoutError:
+            return False
+
+    def release(self):
+        self.in_flight -= 1
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= self.limits[priority]:
+                return
+            heapq.heappop(self._waiters)
+            self.in_flight += 1
+            future.set_result(True)
+
+    # Requests of the same or higher priority that are already queued go
+    # first, so newcomers cannot overtake them.
+    def _waiting_before(self, priority: int) -> bool:
+        return any(not future.done() and waiting <= priority for waiting, _, future in self._waiters)
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: AdmissionController = None):
+        self.app = app
+        self.controller = controller or AdmissionController()
+
+    async def __call__(self, scope, receive, send):
+        if not ADMISSION_CONTROL or scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        if not await self.controller.acquire(route_priority(scope["method"], scope["path"])):
+            response = JSONResponse({"detail": "Server busy"}, status_code=503, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
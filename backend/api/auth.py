@@ -1,16 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from fastapi import Query
+from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+from functools import lru_cache
 import base64
 import secrets
 from backend.schemas.user import UserCreate, UserRead
 from backend.schemas.token import Token
 from backend.models.user import User
-from backend.db import get_async_db
+from backend.db import SessionRoute, get_async_db, insert_returning
 from backend.auth import hash_password, verify_password, create_access_token
 from uuid import uuid4
 import smtplib
@@ -18,7 +21,7 @@ from email.message import EmailMessage
 from jose import jwt, JWTError
 from backend.auth import SECRET_KEY, ALGORITHM
 
-router = APIRouter(prefix="/auth", tags=["Auth"])
+router = APIRouter(prefix="/auth", tags=["Auth"], route_class=SessionRoute)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 nonce_store = {}
 
@@ -50,14 +53,16 @@ def decode_token(token: str):
         raise
 
 @router.post("/register", response_model=UserRead)
-async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+async def register(user: UserCreate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
     result = await db.execute(select(User).where(User.username == user.username))
     existing = result.scalar_one_or_none()
     if existing:
         raise HTTPException(status_code=400, detail="Username already taken")
 
     token = str(uuid4())
-    db_user = User(
+    db_user = await insert_returning(
+        db,
+        User,
         username=user.username,
         password_hash=hash_password(user.password),
         email=user.email,
@@ -65,11 +70,11 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
         confirmation_token=token,
         email_confirmed=False,
     )
-    db.add(db_user)
     await db.commit()
-    await db.refresh(db_user)
 
-    send_confirmation_email(db_user.email, token)
+    # SMTP is slow and blocking; the email goes out in a worker thread
+    # after the response, with no connection held.
+    background_tasks.add_task(send_confirmation_email, db_user.email, token)
 
     return db_user
 
@@ -90,16 +95,45 @@ async def confirm_email(token: str, db: AsyncSession = Depends(get_async_db)):
 
 
 
+# Parsed keys are cached by their PEM, so repeat logins skip parsing.
+@lru_cache(maxsize=4096)
+def load_public_key(public_key_pem: str):
+    return serialization.load_pem_public_key(public_key_pem.encode())
+
+
+# A 64-byte signature is taken as raw r||s first; a short DER encoding can
+# have the same length.
+def verify_ecdsa(public_key, message: bytes, signature: bytes):
+    if len(signature) == 64:
+        raw = encode_dss_signature(int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big"))
+        try:
+            public_key.verify(raw, message, ec.ECDSA(hashes.SHA256()))
+            return
+        except InvalidSignature:
+            pass
+    public_key.verify(signature, message, ec.ECDSA(hashes.SHA256()))
+
+
+# The scheme follows the stored key: RSA keys verify PKCS#1 v1.5 with
+# SHA-256, Ed25519 keys pure Ed25519 and P-256 keys ECDSA with SHA-256.
+# ECDSA signatures may be DER or raw r||s as produced by WebCrypto.
 def verify_signature(public_key_pem: str, message: str, signature_b64: str) -> bool:
     try:
-        public_key = serialization.load_pem_public_key(public_key_pem.encode())
+        public_key = load_public_key(public_key_pem)
         signature = base64.b64decode(signature_b64)
-        public_key.verify(
-            signature,
-            message.encode(),
-            padding.PKCS1v15(),
-            hashes.SHA256(),
-        )
+        if isinstance(public_key, ed25519.Ed25519PublicKey):
+            public_key.verify(signature, message.encode())
+        elif isinstance(public_key, ec.EllipticCurvePublicKey) and isinstance(public_key.curve, ec.SECP256R1):
+            verify_ecdsa(public_key, message.encode(), signature)
+        elif isinstance(public_key, rsa.RSAPublicKey):
+            public_key.verify(
+                signature,
+                message.encode(),
+                padding.PKCS1v15(),
+                hashes.SHA256(),
+            )
+        else:
+            return False
         return True
     except Exception:
         return False
@@ -148,7 +182,7 @@ async def is_email_confirmed(username: str = Query(...), db: AsyncSession = Depe
     return user.email_confirmed
 
 @router.post("/resend-confirmation")
-async def resend_confirmation_email(data: dict, db: AsyncSession = Depends(get_async_db)):
+async def resend_confirmation_email(data: dict, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
     username = data.get("username")
     if not username:
         raise HTTPException(status_code=400, detail="Missing username")
@@ -162,7 +196,7 @@ async def resend_confirmation_email(data: dict, db: AsyncSession = Depends(get_a
     if user.email_confirmed:
         raise HTTPException(status_code=400, detail="Email already confirmed")
 
-    send_confirmation_email(user.email, user.confirmation_token)
+    background_tasks.add_task(send_confirmation_email, user.email, user.confirmation_token)
     return {"message": "Confirmation email sent"}
 
 
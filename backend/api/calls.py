@@ -1,23 +1,34 @@
 import uuid
+from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Request, Response
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
-from backend.db import get_async_db
+from sqlalchemy import select, delete, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from backend.db import SessionRoute, get_async_db
 from backend.models.call_session import CallSession
+from backend.models.GroupMember import GroupMember
 from backend.models.participant import Participant
 from backend.schemas.call import CallSessionRead
 from backend.schemas.call import ParticipantRead
 from backend.auth import get_current_user
+from backend.events import event_bus
+from backend.versions import resource_versions
 from backend.models.user import User
 
 
 class CallJoinRequest(BaseModel):
     session_key: Optional[str] = None
 
-router = APIRouter(prefix="/calls", tags=["calls"])
+router = APIRouter(prefix="/calls", tags=["calls"], route_class=SessionRoute)
+
+
+def publish_call_invitation(call_id: str, creator: str, usernames):
+    for username in set(usernames):
+        if username != creator:
+            event_bus.publish(username, "call_invitation", {"call_id": call_id, "creator": creator})
 
 
 @router.get("/invitations")
@@ -47,23 +58,18 @@ async def accept_call(
     db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user)
 ):
-    q = await db.execute(
-        select(Participant).where(
+    result = await db.execute(
+        delete(Participant)
+        .where(
             Participant.call_id == call_id,
             Participant.user_id == user.username
         )
+        .returning(Participant.id)
     )
-    existing = q.scalar_one_or_none()
-    if not existing:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=403, detail="Nu ai fost invitat la acest apel")
-
-    await db.execute(
-        delete(Participant).where(
-            Participant.call_id == call_id,
-            Participant.user_id == user.username
-        )
-    )
     await db.commit()
+    resource_versions.bump("participants", call_id)
     return {"detail": f"{user.username} accepted {call_id}"}
 
 
@@ -76,17 +82,32 @@ async def join_call(
     user: User = Depends(get_current_user),
 
 ):
-    session_key = req.session_key
-    session = await db.get(CallSession, call_id)
-    if not session:
-        if not session_key:
-            raise HTTPException(400, detail="session_key required to create session")
-        session = CallSession(id=call_id, creator=user.username, session_key=session_key)
-        db.add(session)
-        await db.commit()
-    part = Participant(call_id=call_id, user_id=user.username)
-    db.add(part)
+    if req.session_key:
+        await db.execute(
+            pg_insert(CallSession)
+            .values(id=call_id, creator=user.username, session_key=req.session_key)
+            .on_conflict_do_nothing(index_elements=[CallSession.id])
+        )
+
+    # The insert only selects a row when the session exists, so an empty
+    # RETURNING means there is nothing to join.
+    stmt = pg_insert(Participant).from_select(
+        ["call_id", "user_id", "joined_at"],
+        select(
+            CallSession.id,
+            literal(user.username),
+            literal(datetime.utcnow()),
+        ).where(CallSession.id == call_id),
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="unique_participant_per_call",
+        set_={"joined_at": stmt.excluded.joined_at},
+    ).returning(Participant.id)
+    result = await db.execute(stmt)
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(400, detail="session_key required to create session")
     await db.commit()
+    resource_versions.bump("participants", call_id)
     return {"detail": f"{user.username} joined {call_id}"}
 
 
@@ -101,6 +122,7 @@ async def leave_call(
       .where(Participant.call_id == call_id, Participant.user_id == user.username)
     )
     await db.commit()
+    resource_versions.bump("participants", call_id)
     return {"detail": f"{user.username} left {call_id}"}
 
 
@@ -110,8 +132,13 @@ async def leave_call(
 )
 async def list_participants(
     call_id: str,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_async_db),
 ):
+    not_modified = resource_versions.check(request, response, "participants", call_id)
+    if not_modified:
+        return not_modified
     q = await db.execute(
         select(Participant).where(Participant.call_id == call_id)
     )
@@ -150,12 +177,79 @@ async def create_group_call(
         if username != user.username:
             db.add(Participant(call_id=call_id, user_id=username))
     await db.commit()
+    resource_versions.bump("participants", call_id)
+    publish_call_invitation(call_id, user.username, participants)
     return {
         "call_id": call_id,
         "creator": user.username,
         "participants": list(set(participants + [user.username]))
     }
 
+@router.post("/group/{group_id}")
+async def create_call_for_group(
+    group_id: int,
+    req: CallJoinRequest,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_current_user)
+):
+    if not req.session_key:
+        raise HTTPException(400, detail="session_key required to create session")
+
+    call_id = f"group_{uuid.uuid4().hex[:8]}"
+    result = await db.execute(
+        pg_insert(CallSession)
+        .from_select(
+            ["id", "creator", "session_key"],
+            select(
+                literal(call_id),
+                literal(user.username),
+                literal(req.session_key),
+            ).where(
+                select(GroupMember.id)
+                .where(
+                    GroupMember.group_id == group_id,
+                    GroupMember.user_id == user.id,
+                    GroupMember.status == "joined"
+                )
+                .exists()
+            ),
+        )
+        .returning(CallSession.id)
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=403, detail="Nu ești membru al acestui grup")
+
+    result = await db.execute(
+        pg_insert(Participant)
+        .from_select(
+            ["call_id", "user_id", "joined_at"],
+            select(
+                literal(call_id),
+                User.username,
+                literal(datetime.utcnow()),
+            )
+            .join(GroupMember, GroupMember.user_id == User.id)
+            .where(
+                GroupMember.group_id == group_id,
+                GroupMember.status == "joined"
+            ),
+        )
+        .on_conflict_do_nothing(constraint="unique_participant_per_call")
+        .returning(Participant.user_id, Participant.joined_at)
+    )
+    participants = result.all()
+    await db.commit()
+    resource_versions.bump("participants", call_id)
+    publish_call_invitation(call_id, user.username, [p.user_id for p in participants])
+    return {
+        "call_id": call_id,
+        "creator": user.username,
+        "participants": [
+            {"user_id": p.user_id, "joined_at": p.joined_at}
+            for p in participants
+        ]
+    }
+
 @router.get("/{call_id}/session_key")
 async def get_session_key(
     call_id: str,
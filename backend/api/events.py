@@ -0,0 +1,74 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.auth import get_current_user
+from backend.db import SessionRoute, get_async_db
+from backend.events import EVENT_HEARTBEAT, Event, event_bus
+from backend.models.user import User
+
+router = APIRouter(prefix="/events", tags=["events"], route_class=SessionRoute)
+
+
+def format_event(event: Event) -> str:
+    return f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data, default=str)}\n\n"
+
+
+# One server-sent event stream per connection, carrying the user's new
+# messages, call invitations and group events. A reconnect with
+# Last-Event-ID replays what was missed, or sends a "resync" event when the
+# replay buffer no longer reaches back that far.
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    username = current_user.username
+    # The stream stays open for a long time; its connection is not needed.
+    await db.close()
+
+    # Subscribing before reading the replay buffer means nothing published
+    # in between is lost; events both replayed and queued are sent once.
+    subscription = event_bus.subscribe(username)
+    backlog = []
+    if last_event_id is not None and last_event_id.isdigit():
+        backlog = event_bus.replay_since(username, int(last_event_id))
+        if backlog is None:
+            backlog = [Event(None, "resync", {})]
+    replayed = {event.id for event in backlog}
+
+    async def stream():
+        try:
+            for event in backlog:
+                if event.id is None:
+                    yield f"event: {event.type}\ndata: {{}}\n\n"
+                    continue
+                yield format_event(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), EVENT_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                # None marks an overflowed queue; the client reconnects.
+                if event is None:
+                    return
+                if event.id in replayed:
+                    continue
+                yield format_event(event)
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
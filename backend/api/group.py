@@ -1,19 +1,73 @@
-from typing import List
+import sys
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select, insert, update, delete, func, literal, case, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from backend.auth import get_current_user
-from backend.db import get_async_db
+from backend.db import SessionRoute, get_async_db, delete_in_chunks, insert_returning, upsert
+from backend.events import event_bus
+from backend.versions import resource_versions
+from backend.group_index import group_index
 from backend.models.group import Group
 from backend.models.GroupMember import GroupMember
+from backend.models.group_message import GroupMessage
 from backend.models.user import User
-from backend.schemas.GroupMember import GroupMemberRead, GroupMemberUpdate
+from backend.schemas.GroupMember import GroupBulkInviteRequest, GroupMemberRead, GroupMemberUpdate
 from backend.schemas.group import GroupCreate, GroupRead
+from backend.schemas.messages import GroupMessageSendRequest
 
-router = APIRouter(prefix="/groups", tags=["Groups"])
+router = APIRouter(prefix="/groups", tags=["Groups"], route_class=SessionRoute)
+
+
+def joined_member(group_id: int, user_id: int):
+    return select(GroupMember.id).where(
+        GroupMember.group_id == group_id,
+        GroupMember.user_id == user_id,
+        GroupMember.status == "joined"
+    )
+
+
+# Byte-order name comparison on PostgreSQL, matching ix_groups_name_c_id;
+# SQLite already compares strings that way.
+def catalog_name(db):
+    if db.get_bind().dialect.name == "postgresql":
+        return Group.name.collate("C")
+    return Group.name
+
+
+# Called after every committed membership change.
+def groups_changed(group_id: int, user_ids=()):
+    group_index.invalidate(group_id, user_ids)
+    resource_versions.bump("group_members", group_id)
+    resource_versions.bump("my_groups", *user_ids)
+
+
+def publish_group_invitation(group, username: str):
+    event_bus.publish(username, "group_invitation", {
+        "group_id": group.id,
+        "group_name": group.name,
+        "creator_username": group.creator_username,
+    })
+
+
+async def groups_with_status(db, user_id: int, status: str):
+    memberships = await group_index.user_groups(db, user_id)
+    group_ids = sorted(group_id for group_id, member_status in memberships.items() if member_status == status)
+    groups = await group_index.groups(db, group_ids)
+    return [
+        {
+            "id": groups[group_id].id,
+            "name": groups[group_id].name,
+            "creator_id": groups[group_id].creator_id,
+            "creator_username": groups[group_id].creator_username,
+        }
+        for group_id in group_ids
+        if group_id in groups
+    ]
 
 
 @router.post("/", response_model=GroupRead)
@@ -22,15 +76,11 @@ async def create_group(
     db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    group = Group(name=data.name, creator_id=current_user.id)
-    db.add(group)
+    # The group and its creator's membership are created together.
+    group = await insert_returning(db, Group, name=data.name, creator_id=current_user.id)
+    await db.execute(insert(GroupMember).values(group_id=group.id, user_id=current_user.id, status="joined"))
     await db.commit()
-    await db.refresh(group)
-
-    member = GroupMember(group_id=group.id, user_id=current_user.id, status="joined")
-    db.add(member)
-    await db.commit()
-    await db.refresh(member)
+    groups_changed(group.id, [current_user.id])
 
     return GroupRead(
         id=group.id,
@@ -40,23 +90,17 @@ async def create_group(
     )
 
 @router.get("/", response_model=List[GroupRead])
-async def get_my_groups(db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
-    result = await db.execute(
-        select(Group, User.username)
-        .join(User, Group.creator_id == User.id)
-        .join(GroupMember, Group.id == GroupMember.group_id)
-        .where(GroupMember.user_id == current_user.id, GroupMember.status == "joined")
-    )
-    groups = result.all()
-    return [
-        {
-            "id": g.Group.id,
-            "name": g.Group.name,
-            "creator_id": g.Group.creator_id,
-            "creator_username": g.username,
-        }
-        for g in groups
-    ]
+async def get_my_groups(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    not_modified = resource_versions.check(request, response, "my_groups", current_user.id)
+    if not_modified:
+        return not_modified
+    return await groups_with_status(db, current_user.id, "joined")
+
 
 @router.post("/{group_id}/invite", response_model=GroupMemberRead)
 async def invite_user(
@@ -65,21 +109,13 @@ async def invite_user(
     db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    result = await db.execute(select(Group).where(Group.id == group_id))
-    group = result.scalar_one_or_none()
+    group = await group_index.group(db, group_id)
     if not group:
         raise HTTPException(status_code=404, detail="Grupul nu există")
     if group.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Doar creatorul grupului poate invita membri")
 
-    result = await db.execute(
-        select(GroupMember).where(
-            GroupMember.group_id == group_id,
-            GroupMember.user_id == data.user_id
-        )
-    )
-    existing = result.scalar_one_or_none()
-    if existing:
+    if data.user_id in group.members:
         raise HTTPException(status_code=400, detail="Utilizatorul este deja în grup sau a fost invitat")
 
     user_result = await db.execute(select(User).where(User.id == data.user_id))
@@ -87,10 +123,19 @@ async def invite_user(
     if not user:
         raise HTTPException(status_code=404, detail="Utilizatorul nu există")
 
-    member = GroupMember(group_id=group_id, user_id=data.user_id, status="invited")
-    db.add(member)
+    # The index above may be stale in this worker; the unique constraint
+    # has the last word.
+    member = await db.scalar(
+        upsert(db, GroupMember)
+        .values(group_id=group_id, user_id=data.user_id, status="invited")
+        .on_conflict_do_nothing(index_elements=["group_id", "user_id"])
+        .returning(GroupMember)
+    )
+    if member is None:
+        raise HTTPException(status_code=400, detail="Utilizatorul este deja în grup sau a fost invitat")
     await db.commit()
-    await db.refresh(member)
+    groups_changed(group_id, [data.user_id])
+    publish_group_invitation(group, user.username)
 
     return GroupMemberRead(
         id=member.id,
@@ -103,6 +148,79 @@ async def invite_user(
     )
 
 
+# Invites many users at once: one query resolves them and one insert skips
+# those already in the group, whatever the number of users.
+@router.post("/{group_id}/invite/bulk")
+async def invite_users(
+    group_id: int,
+    data: GroupBulkInviteRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    if not data.user_ids and not data.usernames:
+        raise HTTPException(status_code=400, detail="Nu ai specificat niciun utilizator")
+
+    group = await group_index.group(db, group_id)
+    if not group:
+        raise HTTPException(status_code=404, detail="Grupul nu există")
+    if group.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Doar creatorul grupului poate invita membri")
+
+    result = await db.execute(
+        select(User.id, User.username)
+        .where(User.id.in_(data.user_ids) | User.username.in_(data.usernames))
+    )
+    users = {row.id: row.username for row in result.all()}
+    found_names = set(users.values())
+    skipped = [
+        {"user_id": user_id, "reason": "not_found"}
+        for user_id in dict.fromkeys(data.user_ids) if user_id not in users
+    ] + [
+        {"username": username, "reason": "not_found"}
+        for username in dict.fromkeys(data.usernames) if username not in found_names
+    ]
+
+    added = []
+    if users:
+        now = datetime.utcnow()
+        result = await db.execute(
+            upsert(db, GroupMember)
+            .values([
+                {"group_id": group_id, "user_id": user_id, "status": "invited", "joined_at": now}
+                for user_id in users
+            ])
+            .on_conflict_do_nothing(index_elements=["group_id", "user_id"])
+            .returning(GroupMember.id, GroupMember.user_id, GroupMember.status, GroupMember.joined_at)
+        )
+        added = result.all()
+        await db.commit()
+
+    added_ids = {row.user_id for row in added}
+    skipped += [
+        {"user_id": user_id, "username": username, "reason": "already_member"}
+        for user_id, username in users.items() if user_id not in added_ids
+    ]
+    groups_changed(group_id, added_ids)
+    for row in added:
+        publish_group_invitation(group, users[row.user_id])
+
+    return {
+        "added": [
+            {
+                "id": row.id,
+                "group_id": group_id,
+                "user_id": row.user_id,
+                "status": row.status,
+                "joined_at": row.joined_at,
+                "group_name": group.name,
+                "username": users[row.user_id],
+            }
+            for row in added
+        ],
+        "skipped": skipped,
+    }
+
+
 @router.post("/{group_id}/accept", response_model=GroupMemberRead)
 async def accept_invite(
     group_id: int,
@@ -121,14 +239,13 @@ async def accept_invite(
     if member.status != "invited":
         raise HTTPException(status_code=400, detail="Nu poți accepta această invitație")
 
-    group_result = await db.execute(select(Group).where(Group.id == group_id))
-    group = group_result.scalar_one_or_none()
+    group = await group_index.group(db, group_id)
     if not group:
         raise HTTPException(status_code=404, detail="Grupul nu există")
 
     member.status = "joined"
     await db.commit()
-    await db.refresh(member)
+    groups_changed(group_id, [current_user.id])
 
     return GroupMemberRead(
         id=member.id,
@@ -142,16 +259,16 @@ async def accept_invite(
 
 
 @router.get("/{group_id}/members")
-async def get_group_members(group_id: int, db: AsyncSession = Depends(get_async_db)):
-    result = await db.execute(
-        select(GroupMember.id, GroupMember.status, User.username)
-        .join(User, GroupMember.user_id == User.id)
-        .where(GroupMember.group_id == group_id)
-    )
-    members = result.all()
+async def get_group_members(group_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    not_modified = resource_versions.check(request, response, "group_members", group_id)
+    if not_modified:
+        return not_modified
+    group = await group_index.group(db, group_id)
+    if group is None:
+        return []
     return [
         {"id": m.id, "status": m.status, "username": m.username}
-        for m in members
+        for m in group.members.values()
     ]
 
 
@@ -162,15 +279,21 @@ async def delete_group(
     db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    result = await db.execute(select(Group).where(Group.id == group_id))
-    group = result.scalar_one_or_none()
+    group = await group_index.group(db, group_id)
     if not group:
         raise HTTPException(status_code=404, detail="Grupul nu există")
     if group.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Doar creatorul grupului îl poate șterge")
 
-    await db.delete(group)
+    # Large groups are emptied in short transactions first; anything added
+    # meanwhile goes with the group through ON DELETE CASCADE.
+    await delete_in_chunks(db, GroupMessage, GroupMessage.group_id == group_id)
+    await delete_in_chunks(db, GroupMember, GroupMember.group_id == group_id)
+    await db.execute(delete(Group).where(Group.id == group_id))
     await db.commit()
+    group_index.invalidate_group(group_id)
+    resource_versions.bump("group_members", group_id)
+    resource_versions.bump("my_groups", *group.members)
     return {"message": "Grupul a fost șters"}
 
 @router.get("/invitations", response_model=List[GroupRead])
@@ -178,24 +301,7 @@ async def get_invitations(
     db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
-    result = await db.execute(
-        select(Group, User.username)
-        .join(User, Group.creator_id == User.id)
-        .join(GroupMember, Group.id == GroupMember.group_id)
-        .where(GroupMember.user_id == current_user.id)
-        .where(GroupMember.status == "invited")
-    )
-    rows = result.all()
-
-    return [
-        {
-            "id": group.id,
-            "name": group.name,
-            "creator_id": group.creator_id,
-            "creator_username": username
-        }
-        for group, username in rows
-    ]
+    return await groups_with_status(db, current_user.id, "invited")
 
 
 @router.post("/{group_id}/request")
@@ -222,12 +328,37 @@ async def request_to_join(
     )
     db.add(new_member)
     await db.commit()
+    groups_changed(group_id, [current_user.id])
     return {"message": "Cererea a fost trimisă"}
 
 
+# Pages through groups ordered by name; pass the name and id of the last
+# group of a page as after_name/after_id to get the next one.
 @router.get("/all", response_model=List[GroupRead])
-async def get_all_groups(db: AsyncSession = Depends(get_async_db)):
-    stmt = select(Group, User.username).join(User, Group.creator_id == User.id)
+async def get_all_groups(
+    q: Optional[str] = Query(None, min_length=1, max_length=100),
+    after_name: Optional[str] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db)
+):
+    name = catalog_name(db)
+    stmt = (
+        select(Group, User.username)
+        .join(User, Group.creator_id == User.id)
+        .order_by(name, Group.id)
+        .limit(limit)
+    )
+    if q is not None:
+        # In byte order the names starting with q are exactly those between
+        # q and q with its last character incremented, an index range scan.
+        stmt = stmt.where(name >= q)
+        if ord(q[-1]) < sys.maxunicode:
+            stmt = stmt.where(name < q[:-1] + chr(ord(q[-1]) + 1))
+        else:
+            stmt = stmt.where(name.startswith(q, autoescape=True))
+    if after_name is not None and after_id is not None:
+        stmt = stmt.where(tuple_(name, Group.id) > tuple_(after_name, after_id))
     result = await db.execute(stmt)
     groups = result.all()
 
@@ -243,16 +374,12 @@ async def get_all_groups(db: AsyncSession = Depends(get_async_db)):
 
 @router.get("/requests")
 async def get_group_join_requests(
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
     db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
-    result = await db.execute(select(Group.id).where(Group.creator_id == current_user.id))
-    owned_groups = result.scalars().all()
-
-    if not owned_groups:
-        return []
-
-    result = await db.execute(
+    stmt = (
         select(
             GroupMember.id,
             GroupMember.group_id,
@@ -266,8 +393,13 @@ async def get_group_join_requests(
         .join(User, GroupMember.user_id == User.id)
         .where(Group.creator_id == current_user.id)
         .where(GroupMember.status == "invited")
+        .order_by(GroupMember.id.desc())
+        .limit(limit)
     )
+    if before_id is not None:
+        stmt = stmt.where(GroupMember.id < before_id)
 
+    result = await db.execute(stmt)
     rows = result.all()
     return [
         {
@@ -290,7 +422,7 @@ async def accept_join_request(
     db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    group = await db.scalar(select(Group).where(Group.id == group_id))
+    group = await group_index.group(db, group_id)
     if not group or group.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Nu ai dreptul să accepți cereri pentru acest grup")
 
@@ -305,6 +437,11 @@ async def accept_join_request(
 
     member.status = "joined"
     await db.commit()
+    groups_changed(group_id, [user_id])
+
+    cached = group.members.get(user_id)
+    username = cached.username if cached else await db.scalar(select(User.username).where(User.id == user_id))
+    event_bus.publish(username, "group_joined", {"group_id": group.id, "group_name": group.name})
     return {"message": "Cererea a fost acceptată"}
 
 @router.post("/{group_id}/requests/{user_id}/reject")
@@ -314,7 +451,7 @@ async def reject_join_request(
     db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    group = await db.scalar(select(Group).where(Group.id == group_id))
+    group = await group_index.group(db, group_id)
     if not group or group.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Nu ai dreptul să respingi cereri pentru acest grup")
 
@@ -329,6 +466,131 @@ async def reject_join_request(
 
     await db.delete(member)
     await db.commit()
+    groups_changed(group_id, [user_id])
     return {"message": "Cererea a fost respinsă"}
 
 
+@router.post("/{group_id}/messages")
+async def send_group_message(
+    group_id: int,
+    data: GroupMessageSendRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    result = await db.execute(
+        insert(GroupMessage)
+        .from_select(
+            ["group_id", "sender_id", "content", "timestamp"],
+            select(
+                literal(group_id),
+                literal(current_user.id),
+                literal(data.encrypted_content),
+                literal(datetime.utcnow()),
+            ).where(joined_member(group_id, current_user.id).exists()),
+        )
+        .returning(GroupMessage.id, GroupMessage.timestamp)
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=403, detail="Nu ești membru al acestui grup")
+    await db.commit()
+    return {"message_id": row.id, "timestamp": row.timestamp.isoformat()}
+
+
+@router.get("/{group_id}/messages")
+async def get_group_messages(
+    group_id: int,
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    if await db.scalar(joined_member(group_id, current_user.id)) is None:
+        raise HTTPException(status_code=403, detail="Nu ești membru al acestui grup")
+
+    stmt = (
+        select(GroupMessage, User.username)
+        .join(User, GroupMessage.sender_id == User.id)
+        .where(GroupMessage.group_id == group_id)
+        .order_by(GroupMessage.id.desc())
+        .limit(limit)
+    )
+    if before_id is not None:
+        stmt = stmt.where(GroupMessage.id < before_id)
+    result = await db.execute(stmt)
+    rows = result.all()
+
+    return [
+        {
+            "id": msg.id,
+            "from": "me" if msg.sender_id == current_user.id else username,
+            "content": msg.content,
+            "timestamp": msg.timestamp.isoformat(),
+        }
+        for msg, username in reversed(rows)
+    ]
+
+
+@router.post("/{group_id}/messages/read")
+async def mark_group_messages_read(
+    group_id: int,
+    up_to_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    latest = (
+        select(func.coalesce(func.max(GroupMessage.id), 0))
+        .where(GroupMessage.group_id == group_id)
+        .scalar_subquery()
+    )
+    if up_to_id is None:
+        up_to = latest
+    else:
+        # Never past the newest message, or later messages would be
+        # counted as read before they exist.
+        up_to = case((literal(up_to_id) < latest, literal(up_to_id)), else_=latest)
+
+    # The watermark only moves forward.
+    result = await db.execute(
+        update(GroupMember)
+        .where(
+            GroupMember.group_id == group_id,
+            GroupMember.user_id == current_user.id,
+            GroupMember.status == "joined"
+        )
+        .values(last_read_message_id=case(
+            (GroupMember.last_read_message_id > up_to, GroupMember.last_read_message_id),
+            else_=up_to,
+        ))
+        .returning(GroupMember.last_read_message_id)
+    )
+    last_read = result.scalar_one_or_none()
+    if last_read is None:
+        raise HTTPException(status_code=403, detail="Nu ești membru al acestui grup")
+    await db.commit()
+    return {"last_read_message_id": last_read}
+
+
+@router.get("/messages/unread")
+async def get_group_unread_counts(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    result = await db.execute(
+        select(GroupMember.group_id, func.count(GroupMessage.id).label("count"))
+        .join(
+            GroupMessage,
+            (GroupMessage.group_id == GroupMember.group_id) &
+            (GroupMessage.id > GroupMember.last_read_message_id)
+        )
+        .where(
+            GroupMember.user_id == current_user.id,
+            GroupMember.status == "joined",
+            GroupMessage.sender_id != current_user.id
+        )
+        .group_by(GroupMember.group_id)
+    )
+    return [
+        {"group_id": r.group_id, "count": r.count}
+        for r in result.all()
+    ]
@@ -1,17 +1,104 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+from typing import Optional
+
+import msgpack
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from backend.db import get_async_db
+from backend.db import SessionRoute, get_async_db, release_connection
+from backend.models.conversation import Conversation
 from backend.models.message import Message
 from backend.models.user import User
-from backend.schemas.messages import MessageSendRequest
+from backend.schemas.messages import MessageSendRequest, MessageBatchSendRequest
 from backend.auth import get_current_user
+from backend.events import event_bus
+from backend.versions import resource_versions
+from backend.rate_limit import RateLimit
+from backend.message_archive import load_archived_messages
+from backend.message_cache import MESSAGE_CACHE, message_cache
+from backend.message_pipeline import MESSAGE_BATCHING
+from backend.message_store import change_horizon, insert_messages, next_change_seq
+from backend.sharding import message_shards
 from datetime import datetime
-from sqlalchemy import select
+import asyncio
+from sqlalchemy import select, update, func, tuple_
+
+
+router = APIRouter(prefix="/messages", tags=["messages"], route_class=SessionRoute)
+
+# Shared by the send routes only; polled reads are not limited.
+send_rate_limit = RateLimit("messages", rate=10, burst=50)
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+def message_text(msg: Message) -> str:
+    # Binary bodies are base64-encoded only for the JSON endpoints.
+    if msg.content_bin is not None:
+        return base64.b64encode(msg.content_bin).decode()
+    return msg.content
+
+
+def message_bytes(msg: Message) -> bytes:
+    if msg.content_bin is not None:
+        return msg.content_bin
+    return msg.content.encode()
+
+
+def message_json(msg, current_user: User, username: str) -> dict:
+    return {
+        "from": "me" if msg.sender_id == current_user.id else username,
+        "content": message_text(msg),
+        "timestamp": msg.timestamp.isoformat(),
+        "status": msg.status
+    }
+
+
+async def usernames_by_id(db, user_ids) -> dict:
+    if not user_ids:
+        return {}
+    result = await db.execute(select(User.id, User.username).where(User.id.in_(user_ids)))
+    return {row.id: row.username for row in result.all()}
+
 
+# Events carry no body, so replay buffers stay small whatever is sent;
+# clients fetch it from /messages/raw/{id} or /messages/sync.
+def publish_message(msg, sender_username: str, receiver_username: str):
+    resource_versions.bump("unread", receiver_username)
+    event_bus.publish(receiver_username, "message", {
+        "id": msg.id,
+        "from": sender_username,
+        "timestamp": msg.timestamp.isoformat(),
+    })
 
-router = APIRouter(prefix="/messages", tags=["messages"])
 
-@router.post("/send")
+async def store_message(db, sender: User, receiver: User, **body) -> Message:
+    values = {
+        "sender_id": sender.id,
+        "receiver_id": receiver.id,
+        "timestamp": datetime.utcnow(),
+        "status": "sent",
+        **body,
+    }
+    if MESSAGE_BATCHING:
+        # The pipeline writes with a connection of its own from the same
+        # pool; holding the caller's while waiting on it can starve the
+        # flush and deadlock every sender.
+        await release_connection(db)
+        message_id = await message_shards.pipeline_for(sender.id, receiver.id).submit(values)
+        new_msg = Message(id=message_id, **values)
+    else:
+        shard = message_shards.shard_for(sender.id, receiver.id)
+        async with message_shards.session(db, shard) as shard_db:
+            message_ids = await insert_messages(shard_db, [values], shard, len(message_shards))
+            await shard_db.commit()
+        new_msg = Message(id=message_ids[0], **values)
+
+    if MESSAGE_CACHE:
+        message_cache.append(sender.username, receiver.username, new_msg)
+    publish_message(new_msg, sender.username, receiver.username)
+    return new_msg
+
+@router.post("/send", dependencies=[Depends(send_rate_limit)])
 async def send_message(
     request: MessageSendRequest,
     db: Session = Depends(get_async_db),
@@ -24,24 +111,80 @@ async def send_message(
     if not receiver:
         raise HTTPException(status_code=404, detail="Receiver not found")
 
-    new_msg = Message(
-        sender_id=current_user.id,
-        receiver_id=receiver.id,
-        content=request.encrypted_content,
-        timestamp=datetime.utcnow(),
-        status="sent"
-    )
-    db.add(new_msg)
-    await db.commit()
-    await db.refresh(new_msg)
+    new_msg = await store_message(db, current_user, receiver, content=request.encrypted_content)
     return {"message_id": new_msg.id, "status": new_msg.status}
 
+@router.post("/send/batch", dependencies=[Depends(send_rate_limit)])
+async def send_messages_batch(
+    request: MessageBatchSendRequest,
+    db: Session = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    usernames = {item.to for item in request.messages}
+    result = await db.execute(select(User.id, User.username).where(User.username.in_(usernames)))
+    receivers = {row.username: row.id for row in result.all()}
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "sender_id": current_user.id,
+            "receiver_id": receivers[item.to],
+            "content": item.encrypted_content,
+            "timestamp": now,
+            "status": "sent",
+        }
+        for item in request.messages
+        if item.to in receivers
+    ]
+
+    by_shard = {}
+    for position, row in enumerate(rows):
+        shard = message_shards.shard_for(row["sender_id"], row["receiver_id"])
+        by_shard.setdefault(shard, []).append(position)
+
+    async def insert_shard(shard, positions):
+        shard_rows = [rows[position] for position in positions]
+        async with message_shards.session(db, shard) as shard_db:
+            shard_ids = await insert_messages(shard_db, shard_rows, shard, len(message_shards))
+            await shard_db.commit()
+        return zip(positions, shard_ids)
+
+    ids = [None] * len(rows)
+    for inserted_ids in await asyncio.gather(*(
+        insert_shard(shard, positions) for shard, positions in by_shard.items()
+    )):
+        for position, message_id in inserted_ids:
+            ids[position] = message_id
+
+    results = []
+    inserted = iter(zip(rows, ids))
+    for item in request.messages:
+        if item.to not in receivers:
+            results.append({"to": item.to, "error": "Receiver not found"})
+            continue
+        row, message_id = next(inserted)
+        msg = Message(id=message_id, **row)
+        if MESSAGE_CACHE:
+            message_cache.append(current_user.username, item.to, msg)
+        publish_message(msg, current_user.username, item.to)
+        results.append({"to": item.to, "message_id": message_id, "status": "sent"})
+    return {"results": results}
+
 @router.get("/with/{username}")
 async def get_messages_with_user(
     username: str,
+    limit: Optional[int] = Query(None, ge=1),
+    before_id: Optional[int] = None,
     db: Session = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
+    use_cache = MESSAGE_CACHE and before_id is None and limit is not None
+    if use_cache and limit <= message_cache.tail:
+        cached = message_cache.get(current_user.username, username, limit)
+        if cached is not None:
+            return [message_json(msg, current_user, username) for msg in cached]
+    cache_version = message_cache.version(current_user.username, username)
+
     stmt = select(User).where(User.username == username)
     result = await db.execute(stmt)
     other_user = result.scalars().first()
@@ -52,26 +195,259 @@ async def get_messages_with_user(
     stmt = select(Message).where(
         ((Message.sender_id == current_user.id) & (Message.receiver_id == other_user.id)) |
         ((Message.sender_id == other_user.id) & (Message.receiver_id == current_user.id))
-    ).order_by(Message.timestamp)
+    )
+    if before_id is not None:
+        stmt = stmt.where(Message.id < before_id)
+
+    async with message_shards.for_pair(db, current_user.id, other_user.id) as shard_db:
+        if limit is None:
+            page = None
+            result = await shard_db.execute(stmt.order_by(Message.timestamp))
+            messages = result.scalars().all()
+        else:
+            page = max(limit, message_cache.tail) if use_cache else limit
+            result = await shard_db.execute(stmt.order_by(Message.timestamp.desc(), Message.id.desc()).limit(page))
+            messages = result.scalars().all()[::-1]
+
+        # Older history lives in the archive once its partition is archived.
+        if page is None or len(messages) < page:
+            archived = await load_archived_messages(
+                shard_db,
+                current_user.id,
+                other_user.id,
+                before_id=messages[0].id if messages else before_id,
+                limit=None if page is None else page - len(messages),
+            )
+            messages = archived + list(messages)
+
+    if limit is not None:
+        if use_cache:
+            message_cache.fill(current_user.username, username, messages, cache_version)
+        messages = messages[-limit:]
+
+    return [message_json(msg, current_user, username) for msg in messages]
+
+@router.post("/send/raw", dependencies=[Depends(send_rate_limit)])
+async def send_raw_message(
+    request: Request,
+    to: Optional[str] = None,
+    db: Session = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith(MSGPACK_MEDIA_TYPE):
+        try:
+            frame = msgpack.unpackb(body)
+            to, body = frame["to"], frame["content"]
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid msgpack frame")
+        if not isinstance(to, str) or not isinstance(body, bytes):
+            raise HTTPException(status_code=400, detail="Invalid msgpack frame")
+    if not to:
+        raise HTTPException(status_code=400, detail="Missing receiver")
 
+    stmt = select(User).where(User.username == to)
     result = await db.execute(stmt)
-    messages = result.scalars().all()
+    receiver = result.scalars().first()
 
-    return [
+    if not receiver:
+        raise HTTPException(status_code=404, detail="Receiver not found")
+
+    new_msg = await store_message(db, current_user, receiver, content_bin=body)
+    return {"message_id": new_msg.id, "status": new_msg.status}
+
+@router.get("/raw/{message_id}")
+async def get_raw_message(
+    message_id: int,
+    db: Session = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    stmt = select(Message).where(
+        (Message.id == message_id) &
+        ((Message.sender_id == current_user.id) | (Message.receiver_id == current_user.id))
+    )
+
+    async def find(shard_db):
+        result = await shard_db.execute(stmt)
+        return result.scalars().first()
+
+    found = [msg for msg in await message_shards.gather(db, find) if msg is not None]
+    msg = found[0] if found else None
+
+    if not msg:
+        raise HTTPException(status_code=404, detail="Message not found")
+
+    return Response(content=message_bytes(msg), media_type="application/octet-stream")
+
+@router.get("/with/{username}/msgpack")
+async def get_messages_with_user_msgpack(
+    username: str,
+    db: Session = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    stmt = select(User).where(User.username == username)
+    result = await db.execute(stmt)
+    other_user = result.scalars().first()
+
+    if not other_user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    stmt = select(Message).where(
+        ((Message.sender_id == current_user.id) & (Message.receiver_id == other_user.id)) |
+        ((Message.sender_id == other_user.id) & (Message.receiver_id == current_user.id))
+    ).order_by(Message.timestamp)
+
+    async with message_shards.for_pair(db, current_user.id, other_user.id) as shard_db:
+        result = await shard_db.execute(stmt)
+        messages = result.scalars().all()
+
+    # Binary bodies go out as msgpack bin, legacy string bodies as str.
+    payload = msgpack.packb([
         {
+            "id": msg.id,
             "from": "me" if msg.sender_id == current_user.id else username,
-            "content": msg.content,
+            "content": msg.content_bin if msg.content_bin is not None else msg.content,
             "timestamp": msg.timestamp.isoformat(),
             "status": msg.status
         }
         for msg in messages
+    ])
+    return Response(content=payload, media_type=MSGPACK_MEDIA_TYPE)
+
+@router.get("/inbox")
+async def get_inbox(
+    limit: int = Query(20, ge=1, le=100),
+    before_at: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    db: Session = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    stmt = (
+        select(Conversation, Message)
+        .outerjoin(Message, Message.id == Conversation.last_message_id)
+        .where(
+            (Conversation.user_a_id == current_user.id) |
+            (Conversation.user_b_id == current_user.id)
+        )
+        .order_by(Conversation.last_message_at.desc(), Conversation.id.desc())
+        .limit(limit)
+    )
+    if before_at is not None and before_id is not None:
+        stmt = stmt.where(
+            tuple_(Conversation.last_message_at, Conversation.id) < tuple_(before_at, before_id)
+        )
+
+    async def page(shard_db):
+        result = await shard_db.execute(stmt)
+        return result.all()
+
+    # Each shard returns its own newest page; the merged page is the newest
+    # ``limit`` of those.
+    rows = [row for shard_rows in await message_shards.gather(db, page) for row in shard_rows]
+    rows.sort(key=lambda row: (row[0].last_message_at, row[0].id), reverse=True)
+    rows = rows[:limit]
+
+    def other_id(conv):
+        return conv.user_b_id if conv.user_a_id == current_user.id else conv.user_a_id
+
+    usernames = await usernames_by_id(db, {other_id(conv) for conv, _ in rows})
+    result = []
+    for conv, msg in rows:
+        username = usernames.get(other_id(conv))
+        result.append({
+            "id": conv.id,
+            "username": username,
+            "last_message_id": conv.last_message_id,
+            "last_message_at": conv.last_message_at.isoformat(),
+            "from": None if msg is None else ("me" if msg.sender_id == current_user.id else username),
+            "content": None if msg is None else message_text(msg),
+            "status": None if msg is None else msg.status,
+        })
+    return result
+
+# The cursor is a string holding one change_seq per shard, joined with ".";
+# a single value applies to every shard. Rows sharing a change_seq (one SQLite UPDATE marks
+# many) are never split across pages, since the cursor could not resume
+# inside them.
+@router.get("/sync")
+async def sync_messages(
+    since: str = Query("0", pattern=r"^\d+(\.\d+)*$"),
+    limit: int = Query(200, ge=1, le=1000),
+    db: Session = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    cursors = [int(value) for value in since.split(".")]
+    if len(cursors) == 1:
+        cursors = cursors * len(message_shards)
+    if len(cursors) != len(message_shards):
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+
+    def changes_query(shard_since, horizon):
+        stmt = select(Message).where(
+            ((Message.receiver_id == current_user.id) | (Message.sender_id == current_user.id)) &
+            (Message.change_seq > shard_since)
+        )
+        if horizon is not None:
+            stmt = stmt.where(Message.change_seq <= horizon)
+        return stmt.order_by(Message.change_seq, Message.id)
+
+    async def changes(shard_db, shard_since):
+        horizon = await change_horizon(shard_db)
+        result = await shard_db.execute(changes_query(shard_since, horizon).limit(limit + 1))
+        messages = result.scalars().all()
+        if len(messages) <= limit:
+            return messages, False
+        boundary = messages[limit].change_seq
+        page = [msg for msg in messages[:limit] if msg.change_seq < boundary]
+        if not page:
+            result = await shard_db.execute(changes_query(boundary - 1, boundary))
+            page = result.scalars().all()
+        return page, True
+
+    async def run(index):
+        async with message_shards.session(db, index) as shard_db:
+            return await changes(shard_db, cursors[index])
+
+    shard_results = await asyncio.gather(*(run(index) for index in range(len(message_shards))))
+    has_more = any(more for _, more in shard_results)
+    shard_messages = [messages for messages, _ in shard_results]
+    next_cursors = [
+        messages[-1].change_seq if messages else cursor
+        for messages, cursor in zip(shard_messages, cursors)
     ]
 
+    messages = [msg for shard in shard_messages for msg in shard]
+    usernames = await usernames_by_id(
+        db, {msg.sender_id for msg in messages} | {msg.receiver_id for msg in messages}
+    )
+    return {
+        "messages": [
+            {
+                "id": msg.id,
+                "from": usernames.get(msg.sender_id),
+                "to": usernames.get(msg.receiver_id),
+                "content": message_text(msg),
+                "timestamp": msg.timestamp.isoformat(),
+                "status": msg.status,
+                "change_seq": msg.change_seq,
+            }
+            for msg in messages
+        ],
+        "cursor": ".".join(str(cursor) for cursor in next_cursors),
+        "has_more": has_more,
+    }
+
 @router.get("/unread")
 async def get_unread_count(
     for_user: str,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_async_db)
 ):
+    not_modified = resource_versions.check(request, response, "unread", for_user)
+    if not_modified:
+        return not_modified
+
     stmt = select(User).where(User.username == for_user)
     result = await db.execute(stmt)
     user = result.scalars().first()
@@ -79,11 +455,14 @@ async def get_unread_count(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    stmt = select(Message).where(
+    stmt = select(func.count(Message.id)).where(
         (Message.receiver_id == user.id) & (Message.status == "sent")
     )
-    result = await db.execute(stmt)
-    count = len(result.scalars().all())
+
+    async def count_unread(shard_db):
+        return await shard_db.scalar(stmt)
+
+    count = sum(await message_shards.gather(db, count_unread))
 
     return {"unread_count": count}
 
@@ -98,19 +477,23 @@ async def get_unread_users(
     if not current_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    stmt = select(Message).where(
-        (Message.receiver_id == current_user.id) &
-        (Message.status == "sent")
+    stmt = (
+        select(Message.sender_id, func.count(Message.id))
+        .where(
+            (Message.receiver_id == current_user.id) &
+            (Message.status == "sent")
+        )
+        .group_by(Message.sender_id)
     )
-    result = await db.execute(stmt)
-    messages = result.scalars().all()
+
+    async def count_by_sender(shard_db):
+        result = await shard_db.execute(stmt)
+        return result.all()
 
     unread_by_user = {}
-    for msg in messages:
-        if msg.sender_id not in unread_by_user:
-            unread_by_user[msg.sender_id] = 1
-        else:
-            unread_by_user[msg.sender_id] += 1
+    for rows in await message_shards.gather(db, count_by_sender):
+        for sender_id, count in rows:
+            unread_by_user[sender_id] = unread_by_user.get(sender_id, 0) + count
 
     sender_ids = list(unread_by_user.keys())
     if not sender_ids:
@@ -139,16 +522,21 @@ async def mark_messages_seen(
     if not other:
         raise HTTPException(status_code=404, detail="User not found")
 
-    stmt = select(Message).where(
-        (Message.sender_id == other.id) &
-        (Message.receiver_id == current_user.id) &
-        (Message.status == "sent")
-    )
-    result = await db.execute(stmt)
-    messages = result.scalars().all()
-
-    for msg in messages:
-        msg.status = "seen"
-
-    await db.commit()
+    async with message_shards.for_pair(db, current_user.id, other.id) as shard_db:
+        stmt = (
+            update(Message)
+            .where(
+                (Message.sender_id == other.id) &
+                (Message.receiver_id == current_user.id) &
+                (Message.status == "sent")
+            )
+            .values(status="seen", change_seq=next_change_seq(shard_db))
+            .returning(Message.id)
+        )
+        result = await shard_db.execute(stmt)
+        messages = result.scalars().all()
+        await shard_db.commit()
+    resource_versions.bump("unread", current_user.username)
+    if MESSAGE_CACHE:
+        message_cache.mark_seen(current_user.username, with_user, other.id)
     return {"marked": len(messages)}
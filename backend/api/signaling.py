@@ -3,32 +3,36 @@ from typing import Optional, List
 from fastapi import APIRouter, Depends, Query, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete, and_
-from backend.db import get_async_db
+from backend.db import SessionRoute, get_async_db, delete_in_chunks, insert_returning
 from backend.models.signaling import SignalingData
 from backend.schemas.signaling import SignalingCreate, SignalingRead
 from backend.auth import get_current_user
 from backend.models.user import User
 from backend.models.call_session import CallSession
-from backend.models.participant import Participant
+from backend.versions import resource_versions
+from backend.rate_limit import RateLimit
 
-router = APIRouter(prefix="/signaling", tags=["Signaling"])
+router = APIRouter(prefix="/signaling", tags=["Signaling"], route_class=SessionRoute)
 
-@router.post("/send", response_model=SignalingRead)
+# Polling for offers and answers is not limited, only sending them.
+send_rate_limit = RateLimit("signaling", rate=20, burst=100)
+
+@router.post("/send", response_model=SignalingRead, dependencies=[Depends(send_rate_limit)])
 async def send_signaling(
     data: SignalingCreate,
     db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
 ):
-    record = SignalingData(
+    record = await insert_returning(
+        db,
+        SignalingData,
         call_id=data.call_id,
         sender=user.username,
         type=data.type,
         content=data.content,
         target_user=data.target_user
     )
-    db.add(record)
     await db.commit()
-    await db.refresh(record)
     return record
 
 
@@ -72,9 +76,10 @@ async def delete_signaling(
     db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user)
 ):
-    await db.execute(delete(SignalingData).where(SignalingData.call_id == call_id))
-    await db.execute(delete(Participant).where(Participant.call_id == call_id))
+    await delete_in_chunks(db, SignalingData, SignalingData.call_id == call_id)
+    # Participants go with the session through ON DELETE CASCADE.
     await db.execute(delete(CallSession).where(CallSession.id == call_id))
     await db.commit()
+    resource_versions.bump("participants", call_id)
 
 
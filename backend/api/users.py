@@ -1,14 +1,15 @@
 from http.client import HTTPException
 
-from fastapi import APIRouter, Depends, Body
+from fastapi import APIRouter, Depends, Body, Request, Response
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from backend.db import get_async_db
+from backend.db import SessionRoute, get_async_db
 from backend.auth import get_current_user
 from backend.models.user import User
 from backend.schemas.user import UserRead, StatusUpdateRequest
+from backend.versions import resource_versions
 
-router = APIRouter(prefix="/users", tags=["Users"])
+router = APIRouter(prefix="/users", tags=["Users"], route_class=SessionRoute)
 
 @router.get("/me")
 def read_current_user(current_user: User = Depends(get_current_user)):
@@ -35,11 +36,15 @@ async def update_status(
 ):
     current_user.status = payload.status
     await db.commit()
+    resource_versions.bump("status", current_user.username)
     return {"status": "updated"}
 
 
 @router.get("/status/{username}")
-async def get_status(username: str, db: AsyncSession = Depends(get_async_db)):
+async def get_status(username: str, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    not_modified = resource_versions.check(request, response, "status", username)
+    if not_modified:
+        return not_modified
     result = await db.execute(select(User).where(User.username == username))
     user = result.scalar_one_or_none()
     if not user:
@@ -12,7 +12,7 @@ from sqlalchemy.orm import Session
 from starlette import status
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from backend.db import get_async_db
+from backend.db import get_async_db, release_connection
 from backend.models.user import User
 
 # JWT settings
@@ -61,4 +61,6 @@ async def get_current_user(
     user = result.scalar_one_or_none()
     if user is None:
         raise credentials_exception
+    # The handler checks out a connection again at its first statement.
+    await release_connection(db)
     return user
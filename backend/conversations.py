@@ -0,0 +1,39 @@
+# backend/conversations.py
+from backend.db import upsert
+from backend.models.conversation import Conversation
+
+
+def conversation_pair(user_id: int, other_id: int) -> tuple[int, int]:
+    return (user_id, other_id) if user_id <= other_id else (other_id, user_id)
+
+
+# Upserts the conversation rows for (id, sender_id, receiver_id, timestamp)
+# tuples inside the caller's transaction. Only the newest message per pair is
+# written, since one statement cannot update the same row twice.
+async def record_messages(db, messages):
+    latest = {}
+    for message_id, sender_id, receiver_id, timestamp in messages:
+        pair = conversation_pair(sender_id, receiver_id)
+        if pair not in latest or latest[pair][0] < message_id:
+            latest[pair] = (message_id, timestamp)
+    if not latest:
+        return
+
+    stmt = upsert(db, Conversation).values([
+        {
+            "user_a_id": user_a_id,
+            "user_b_id": user_b_id,
+            "last_message_id": message_id,
+            "last_message_at": timestamp,
+        }
+        for (user_a_id, user_b_id), (message_id, timestamp) in latest.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Conversation.user_a_id, Conversation.user_b_id],
+        set_={
+            "last_message_id": stmt.excluded.last_message_id,
+            "last_message_at": stmt.excluded.last_message_at,
+        },
+        where=Conversation.last_message_at <= stmt.excluded.last_message_at,
+    )
+    await db.execute(stmt)
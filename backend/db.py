@@ -1,6 +1,11 @@
 # backend/db.py
+import inspect
+
+from fastapi.routing import APIRoute
+from sqlalchemy import delete, event, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import DeclarativeBase, Session
 from dotenv import load_dotenv
 import os
 
@@ -8,13 +13,113 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+asyncpg://tode@localhost:5432/webrtc_db")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+# Rows removed per transaction by delete_in_chunks.
+DELETE_CHUNK = int(os.getenv("DELETE_CHUNK", "1000"))
+
+# Connections the pool hands out at most; admission control sizes itself
+# from the same numbers.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_CAPACITY = DB_POOL_SIZE + DB_MAX_OVERFLOW
+
+engine = create_async_engine(DATABASE_URL, echo=True, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+
+# SQLite only enforces foreign keys, and so ON DELETE CASCADE, when enabled
+# on each connection.
+def enable_sqlite_foreign_keys(async_engine):
+    if async_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def set_foreign_keys(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+enable_sqlite_foreign_keys(engine)
 
 async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 class Base(DeclarativeBase):
     pass
 
+# Creating a session does not touch the pool: a connection is checked out
+# at its first statement and given back when the transaction ends, so with
+# release_connection a request holds one only while it talks to the
+# database.
 async def get_async_db():
     async with async_session() as db:
         yield db
+
+# Sessions remember whether their current transaction wrote anything, so a
+# read-only transaction can be ended early without committing stray writes.
+@event.listens_for(Session, "do_orm_execute")
+def track_orm_writes(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["writes"] = True
+
+@event.listens_for(Session, "after_flush")
+def track_flushed_writes(session, _):
+    session.info["writes"] = True
+
+@event.listens_for(Session, "after_transaction_end")
+def reset_writes(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("writes", None)
+
+# Ends a read-only transaction so its connection goes back to the pool;
+# loaded objects stay usable (expire_on_commit=False) and the next statement
+# checks out a connection again. Transactions with writes are left alone
+# for the handler to commit or for the session to roll back.
+async def release_connection(db: AsyncSession):
+    if not db.in_transaction() or db.info.get("writes") or db.new or db.dirty or db.deleted:
+        return
+    await db.commit()
+
+# Route class that releases the request's session as soon as the endpoint
+# returns, before the response is serialized and sent, rather than when
+# FastAPI tears the dependency down.
+class SessionRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        if not inspect.iscoroutinefunction(endpoint):
+            return
+
+        async def call(**values):
+            response = await endpoint(**values)
+            for value in values.values():
+                if isinstance(value, AsyncSession):
+                    await release_connection(value)
+            return response
+
+        # The request handler was built around this dependant and looks up
+        # ``call`` on every request.
+        self.dependant.call = call
+
+# INSERT ... ON CONFLICT for whichever database the session is bound to;
+# message shards may be SQLite databases.
+def upsert(db, model):
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
+
+# Inserts one row with INSERT ... RETURNING and returns it as a persistent
+# instance of ``model``, so ids and defaults come back with the insert rather
+# than from a refresh after the commit.
+async def insert_returning(db, model, **values):
+    return await db.scalar(insert(model).values(**values).returning(model))
+
+# Deletes the matching rows of ``model`` a chunk at a time, committing after
+# each chunk so no transaction locks or logs every row at once.
+async def delete_in_chunks(db, model, *criteria, chunk: int = DELETE_CHUNK) -> int:
+    deleted = 0
+    while True:
+        result = await db.execute(
+            delete(model)
+            .where(model.id.in_(select(model.id).where(*criteria).limit(chunk)))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        deleted += result.rowcount
+        if result.rowcount < chunk:
+            return deleted
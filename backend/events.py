@@ -0,0 +1,130 @@
+# backend/events.py
+import asyncio
+import os
+import secrets
+import time
+from collections import OrderedDict, deque
+
+from backend.pubsub import pubsub as default_pubsub
+
+# Event bus behind /events/stream. Events travel over the pub/sub backend on
+# "user:<username>" channels, so every worker sees every event and keeps the
+# last EVENT_REPLAY of each user for clients resuming from Last-Event-ID.
+EVENT_REPLAY = int(os.getenv("EVENT_REPLAY", "100"))
+# Users with a replay buffer; the least recently active are dropped first.
+EVENT_REPLAY_USERS = int(os.getenv("EVENT_REPLAY_USERS", "10000"))
+# Events queued for a slow stream before it is closed; the client then
+# reconnects and catches up from the replay buffer.
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "256"))
+# Seconds between keep-alive comments on an idle stream.
+EVENT_HEARTBEAT = float(os.getenv("EVENT_HEARTBEAT", "15"))
+# Low bits of an event id that name the publishing process.
+NODE_BITS = 32
+
+
+class Event:
+    __slots__ = ("id", "type", "data")
+
+    def __init__(self, id, type, data):
+        self.id = id
+        self.type = type
+        self.data = data
+
+
+# A user's recent events in arrival order.
+class ReplayBuffer:
+    __slots__ = ("events",)
+
+    def __init__(self, size: int):
+        self.events = deque(maxlen=size)
+
+    def append(self, event: Event):
+        self.events.append(event)
+
+
+class Subscription:
+    def __init__(self, username: str, queue_size: int):
+        self.username = username
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def push(self, event: Event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            # Wakes the reader so it notices the overflow and ends the stream.
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class EventBus:
+    def __init__(self, pubsub=default_pubsub, replay: int = EVENT_REPLAY, replay_users: int = EVENT_REPLAY_USERS, queue_size: int = EVENT_QUEUE_SIZE):
+        self.pubsub = pubsub
+        self.replay = replay
+        self.replay_users = replay_users
+        self.queue_size = queue_size
+        # Event ids are a clock in 1/1024 ms that also moves past every id
+        # seen from other workers, so ids keep growing across workers and
+        # restarts; the low bits are a random id of this process, keeping
+        # them unique (pids can collide once truncated).
+        self._clock = 0
+        self._node = secrets.randbits(NODE_BITS)
+        self._buffers: OrderedDict = OrderedDict()
+        # Newest event id of any buffer dropped to stay under replay_users.
+        self._dropped_id = 0
+        self._subscribers: dict = {}
+
+    def publish(self, username: str, type: str, data: dict):
+        self._clock = max(self._clock + 1, int(time.time() * 1000) << 10)
+        event_id = self._clock << NODE_BITS | self._node
+        self.pubsub.publish(f"user:{username}", {"id": event_id, "type": type, "data": data})
+
+    def receive(self, channel: str, message: dict):
+        username = channel[len("user:"):]
+        event = Event(message["id"], message["type"], message["data"])
+        self._clock = max(self._clock, event.id >> NODE_BITS)
+        buffer = self._buffers.get(username)
+        if buffer is None:
+            buffer = self._buffers[username] = ReplayBuffer(self.replay)
+            while len(self._buffers) > self.replay_users:
+                _, dropped = self._buffers.popitem(last=False)
+                self._dropped_id = max(self._dropped_id, dropped.events[-1].id)
+        else:
+            self._buffers.move_to_end(username)
+        buffer.append(event)
+        for subscription in self._subscribers.get(username, ()):
+            subscription.push(event)
+
+    # Returns the events buffered after ``last_event_id`` arrived, or None
+    # when it is no longer in the buffer and the client must resync by
+    # polling. Events from other workers can arrive out of id order, so the
+    # replay follows arrival rather than comparing ids.
+    def replay_since(self, username: str, last_event_id: int):
+        buffer = self._buffers.get(username)
+        if buffer is None:
+            return None if last_event_id < self._dropped_id else []
+        events = list(buffer.events)
+        for position in range(len(events) - 1, -1, -1):
+            if events[position].id == last_event_id:
+                return events[position + 1:]
+        return None
+
+    def subscribe(self, username: str) -> Subscription:
+        subscription = Subscription(username, self.queue_size)
+        self._subscribers.setdefault(username, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscribers.get(subscription.username)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscribers[subscription.username]
+
+
+event_bus = EventBus()
+default_pubsub.subscribe("user:", event_bus.receive)
@@ -0,0 +1,196 @@
+# backend/group_index.py
+import os
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+
+from backend.models.group import Group
+from backend.models.GroupMember import GroupMember
+from backend.models.user import User
+from backend.pubsub import pubsub as default_pubsub
+
+# Per-process index of group memberships. Every mutation in the groups API
+# invalidates it in every worker through the pub/sub layer; entries also
+# expire after GROUP_INDEX_TTL seconds, which bounds staleness when the
+# "local" backend cannot reach other workers.
+GROUP_INDEX = os.getenv("GROUP_INDEX", "true").lower() in ("1", "true", "yes")
+GROUP_INDEX_TTL = float(os.getenv("GROUP_INDEX_TTL", "30"))
+# Upper bound on cached groups, users and memberships combined.
+GROUP_INDEX_ENTRIES = int(os.getenv("GROUP_INDEX_ENTRIES", "200000"))
+
+
+class CachedMember:
+    __slots__ = ("id", "status", "username")
+
+    def __init__(self, id, status, username):
+        self.id = id
+        self.status = status
+        self.username = username
+
+
+class CachedGroup:
+    __slots__ = ("id", "name", "creator_id", "creator_username", "members", "loaded_at")
+
+    def __init__(self, id, name, creator_id, creator_username, members, loaded_at):
+        self.id = id
+        self.name = name
+        self.creator_id = creator_id
+        self.creator_username = creator_username
+        # user_id -> CachedMember
+        self.members = members
+        self.loaded_at = loaded_at
+
+    @property
+    def size(self) -> int:
+        return 1 + len(self.members)
+
+
+class CachedUserGroups:
+    __slots__ = ("groups", "loaded_at")
+
+    def __init__(self, groups, loaded_at):
+        # group_id -> membership status
+        self.groups = groups
+        self.loaded_at = loaded_at
+
+    @property
+    def size(self) -> int:
+        return 1 + len(self.groups)
+
+
+class GroupIndex:
+    def __init__(self, pubsub=default_pubsub, enabled: bool = GROUP_INDEX, ttl: float = GROUP_INDEX_TTL,
+                 max_entries: int = GROUP_INDEX_ENTRIES):
+        self.pubsub = pubsub
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.used_entries = 0
+        self._groups: OrderedDict = OrderedDict()
+        self._users: OrderedDict = OrderedDict()
+        # Bumped by every invalidation, so a load that raced with a mutation
+        # is returned but not stored.
+        self._generation = 0
+
+    # Returns the cached groups for ``group_ids`` that exist, loading the
+    # missing ones with one query for the groups and one for their members.
+    async def groups(self, db, group_ids: Iterable[int]) -> dict:
+        found, missing = {}, []
+        now = time.monotonic()
+        for group_id in group_ids:
+            entry = self._fresh(self._groups, group_id, now)
+            if entry is None:
+                missing.append(group_id)
+            else:
+                found[group_id] = entry
+        if missing:
+            generation = self._generation
+            loaded = await self._load_groups(db, missing, now)
+            found.update(loaded)
+            if generation == self._generation:
+                for group_id, entry in loaded.items():
+                    self._store(self._groups, group_id, entry)
+        return found
+
+    async def group(self, db, group_id: int) -> Optional[CachedGroup]:
+        return (await self.groups(db, [group_id])).get(group_id)
+
+    # group_id -> status of every membership of the user.
+    async def user_groups(self, db, user_id: int) -> dict:
+        now = time.monotonic()
+        entry = self._fresh(self._users, user_id, now)
+        if entry is None:
+            generation = self._generation
+            result = await db.execute(
+                select(GroupMember.group_id, GroupMember.status).where(GroupMember.user_id == user_id)
+            )
+            entry = CachedUserGroups(dict(result.all()), now)
+            if generation == self._generation:
+                self._store(self._users, user_id, entry)
+        return entry.groups
+
+    # Drops the group and the listed users' memberships in every worker;
+    # called after the mutation is committed and before its version bump, so
+    # a worker has dropped its entries by the time it sees the new ETag.
+    def invalidate(self, group_id: Optional[int] = None, user_ids: Iterable[int] = ()):
+        self.pubsub.publish("group_index:invalidate", {"group_id": group_id, "user_ids": list(user_ids)})
+
+    # A deleted group disappears from every cached user, not only the
+    # members known to its own entry.
+    def invalidate_group(self, group_id: int):
+        self.pubsub.publish("group_index:invalidate_group", {"group_id": group_id})
+
+    def receive(self, channel: str, message: dict):
+        if channel == "group_index:invalidate_group":
+            self._invalidate_group(message["group_id"])
+        else:
+            self._invalidate(message["group_id"], message["user_ids"])
+
+    def _invalidate(self, group_id: Optional[int], user_ids: Iterable[int]):
+        self._generation += 1
+        if group_id is not None:
+            self._drop(self._groups, group_id)
+        for user_id in user_ids:
+            self._drop(self._users, user_id)
+
+    def _invalidate_group(self, group_id: int):
+        self._generation += 1
+        self._drop(self._groups, group_id)
+        for user_id in [user_id for user_id, entry in self._users.items() if group_id in entry.groups]:
+            self._drop(self._users, user_id)
+
+    async def _load_groups(self, db, group_ids, now) -> dict:
+        result = await db.execute(
+            select(Group.id, Group.name, Group.creator_id, User.username)
+            .join(User, Group.creator_id == User.id)
+            .where(Group.id.in_(group_ids))
+        )
+        loaded = {
+            row.id: CachedGroup(row.id, row.name, row.creator_id, row.username, {}, now)
+            for row in result.all()
+        }
+        if loaded:
+            result = await db.execute(
+                select(GroupMember.id, GroupMember.group_id, GroupMember.user_id, GroupMember.status, User.username)
+                .join(User, GroupMember.user_id == User.id)
+                .where(GroupMember.group_id.in_(list(loaded)))
+                .order_by(GroupMember.id)
+            )
+            for row in result.all():
+                loaded[row.group_id].members[row.user_id] = CachedMember(row.id, row.status, row.username)
+        return loaded
+
+    def _fresh(self, entries: OrderedDict, key, now):
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if now - entry.loaded_at > self.ttl:
+            self._drop(entries, key)
+            return None
+        entries.move_to_end(key)
+        return entry
+
+    def _store(self, entries: OrderedDict, key, entry):
+        if not self.enabled or entry.size > self.max_entries:
+            return
+        self._drop(entries, key)
+        entries[key] = entry
+        self.used_entries += entry.size
+        self._evict()
+
+    def _drop(self, entries: OrderedDict, key):
+        entry = entries.pop(key, None)
+        if entry is not None:
+            self.used_entries -= entry.size
+
+    def _evict(self):
+        while self.used_entries > self.max_entries and (self._groups or self._users):
+            # Evict from whichever map holds more, oldest entry first.
+            entries = self._groups if len(self._groups) >= len(self._users) else self._users
+            self._drop(entries, next(iter(entries)))
+
+
+group_index = GroupIndex()
+default_pubsub.subscribe("group_index:", group_index.receive)
@@ -0,0 +1,221 @@
+# backend/message_archive.py
+import os
+import re
+import zlib
+from datetime import datetime
+from typing import Optional
+
+import msgpack
+from sqlalchemy import insert, select, text
+from sqlalchemy.schema import CreateIndex
+
+from backend.conversations import conversation_pair
+from backend.db import engine
+from backend.models.message import Message
+from backend.models.message_archive import MessageArchive
+
+# Monthly partitions newer than this stay in the hot table.
+MESSAGE_HOT_MONTHS = int(os.getenv("MESSAGE_HOT_MONTHS", "6"))
+MESSAGE_PARTITIONS_AHEAD = int(os.getenv("MESSAGE_PARTITIONS_AHEAD", "3"))
+# Messages per archive row; a history page decompresses at most a few rows.
+ARCHIVE_CHUNK = 500
+# Messages moved per transaction when archiving a partition.
+ARCHIVE_BATCH = int(os.getenv("MESSAGE_ARCHIVE_BATCH", "5000"))
+
+ARCHIVE_FIELDS = ("id", "sender_id", "receiver_id", "content", "content_bin", "timestamp", "status", "change_seq")
+PARTITION_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def month_start(value: datetime, offset: int = 0) -> datetime:
+    month = value.year * 12 + value.month - 1 + offset
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+async def message_partitions(conn):
+    if conn.dialect.name != "postgresql":
+        return []
+    result = await conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'messages'::regclass"
+    ))
+    partitions = []
+    for name, bound in result.all():
+        match = PARTITION_UPPER_BOUND.search(bound)
+        if match:
+            partitions.append((name, datetime.fromisoformat(match.group(1))))
+    return partitions
+
+
+# Message shards are created by init_shards rather than the migrations. On
+# PostgreSQL their messages table gets the same monthly partitioning, without
+# the foreign keys to users, so they are archived like the primary. A shard
+# whose messages table already exists unpartitioned is left as it is.
+async def create_partitioned_messages(conn, months_ahead: int = MESSAGE_PARTITIONS_AHEAD):
+    relkind = await conn.scalar(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('messages')"))
+    if relkind is not None and relkind != "p":
+        return
+    await conn.execute(text("CREATE SEQUENCE IF NOT EXISTS messages_id_seq"))
+    await conn.execute(text("CREATE SEQUENCE IF NOT EXISTS message_change_seq"))
+    await conn.execute(text(
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+            sender_id INTEGER,
+            receiver_id INTEGER,
+            content VARCHAR,
+            content_bin BYTEA,
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            status VARCHAR,
+            change_seq BIGINT DEFAULT nextval('message_change_seq'),
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+        """
+    ))
+    await conn.execute(text("ALTER SEQUENCE messages_id_seq OWNED BY messages.id"))
+    for index in Message.__table__.indexes:
+        await conn.execute(CreateIndex(index, if_not_exists=True))
+    start = month_start(datetime.utcnow())
+    for _ in range(months_ahead + 1):
+        upper = month_start(start, 1)
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS messages_{start:%Y_%m} PARTITION OF messages "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{upper.isoformat()}')"
+        ))
+        start = upper
+    await conn.execute(text("CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT"))
+
+
+# Every function below works on the primary database unless given the engine
+# of a message shard; SQLite shards are not partitioned and are left alone.
+async def ensure_message_partitions(months_ahead: int = MESSAGE_PARTITIONS_AHEAD, bind=engine):
+    async with bind.begin() as conn:
+        partitions = await message_partitions(conn)
+        if not partitions:
+            return []
+        start = max((upper for _, upper in partitions), default=month_start(datetime.utcnow()))
+        end = month_start(datetime.utcnow(), months_ahead + 1)
+        created = []
+        while start < end:
+            upper = month_start(start, 1)
+            name = f"messages_{start:%Y_%m}"
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF messages "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{upper.isoformat()}')"
+            ))
+            created.append(name)
+            start = upper
+    return created
+
+
+def pack_messages(rows) -> bytes:
+    return zlib.compress(msgpack.packb([
+        [row.id, row.sender_id, row.receiver_id, row.content, row.content_bin,
+         row.timestamp.isoformat(), row.status, row.change_seq]
+        for row in rows
+    ]))
+
+
+def unpack_messages(payload: bytes):
+    messages = []
+    for values in msgpack.unpackb(zlib.decompress(payload)):
+        fields = dict(zip(ARCHIVE_FIELDS, values))
+        fields["timestamp"] = datetime.fromisoformat(fields["timestamp"])
+        messages.append(Message(**fields))
+    return messages
+
+
+# Archive rows for a batch of messages: one per conversation and
+# ARCHIVE_CHUNK messages, in id order within each conversation.
+def archive_rows(rows) -> list:
+    def pair(row):
+        return conversation_pair(row.sender_id, row.receiver_id if row.receiver_id is not None else row.sender_id)
+
+    archive = []
+    chunk, chunk_pair = [], None
+
+    def flush():
+        if chunk:
+            archive.append({
+                "user_a_id": chunk_pair[0],
+                "user_b_id": chunk_pair[1],
+                "first_message_id": chunk[0].id,
+                "last_message_id": chunk[-1].id,
+                "message_count": len(chunk),
+                "payload": pack_messages(chunk),
+                "archived_at": datetime.utcnow(),
+            })
+
+    for row in sorted(rows, key=lambda row: (pair(row), row.id)):
+        if pair(row) != chunk_pair or len(chunk) >= ARCHIVE_CHUNK:
+            flush()
+            chunk, chunk_pair = [], pair(row)
+        chunk.append(row)
+    flush()
+    return archive
+
+
+# Moves one partition into message_archive a batch at a time, each batch
+# archived and deleted from the partition in one short transaction, so
+# readers see every message either hot or archived and no transaction holds
+# the whole partition. Batches follow message ids, so a conversation's
+# archive rows never overlap. The emptied partition is then dropped.
+async def archive_partition(name: str, bind=engine, batch: int = ARCHIVE_BATCH) -> int:
+    archived = 0
+    while True:
+        async with bind.begin() as conn:
+            result = await conn.execute(text(
+                f"SELECT id, sender_id, receiver_id, content, content_bin, timestamp, status, change_seq "
+                f"FROM {name} ORDER BY id LIMIT :batch"
+            ), {"batch": batch})
+            rows = result.all()
+            if not rows:
+                break
+            await conn.execute(insert(MessageArchive), archive_rows(rows))
+            await conn.execute(text(f"DELETE FROM {name} WHERE id = ANY(:ids)"), {"ids": [row.id for row in rows]})
+        archived += len(rows)
+
+    async with bind.begin() as conn:
+        await conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+        await conn.execute(text(f"DROP TABLE {name}"))
+    return archived
+
+
+async def archive_old_partitions(hot_months: int = MESSAGE_HOT_MONTHS, bind=engine):
+    cutoff = month_start(datetime.utcnow(), -hot_months)
+    async with bind.connect() as conn:
+        partitions = await message_partitions(conn)
+    archived = {}
+    for name, upper in sorted(partitions, key=lambda p: p[1]):
+        if upper <= cutoff:
+            archived[name] = await archive_partition(name, bind)
+    return archived
+
+
+# Returns archived messages of a conversation older than ``before_id``,
+# oldest first; at most ``limit`` of them when a limit is given.
+async def load_archived_messages(db, user_id: int, other_id: int, before_id: Optional[int] = None, limit: Optional[int] = None):
+    user_a_id, user_b_id = conversation_pair(user_id, other_id)
+    stmt = (
+        select(MessageArchive.payload)
+        .where(
+            MessageArchive.user_a_id == user_a_id,
+            MessageArchive.user_b_id == user_b_id
+        )
+        .order_by(MessageArchive.last_message_id.desc())
+    )
+    if before_id is not None:
+        stmt = stmt.where(MessageArchive.first_message_id < before_id)
+
+    messages = []
+    result = await db.stream_scalars(stmt)
+    async for payload in result:
+        chunk = [
+            msg for msg in unpack_messages(payload)
+            if before_id is None or msg.id < before_id
+        ]
+        messages = chunk + messages
+        if limit is not None and len(messages) >= limit:
+            break
+    await result.close()
+    return messages if limit is None else messages[-limit:]
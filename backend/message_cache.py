@@ -0,0 +1,124 @@
+# backend/message_cache.py
+import os
+from collections import OrderedDict, deque
+
+# Opt-in, per-process cache of the most recent messages of each conversation.
+# Only enable it when a single worker serves the messages routes, otherwise
+# other workers' sends are not seen.
+MESSAGE_CACHE = os.getenv("MESSAGE_CACHE", "false").lower() in ("1", "true", "yes")
+MESSAGE_CACHE_TAIL = int(os.getenv("MESSAGE_CACHE_TAIL", "50"))
+MESSAGE_CACHE_BYTES = int(os.getenv("MESSAGE_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+# Rough per-entry overhead of the Python objects around the message body.
+ENTRY_OVERHEAD = 200
+WRITE_SLOTS = 4096
+
+
+class CachedMessage:
+    __slots__ = ("id", "sender_id", "content", "content_bin", "timestamp", "status")
+
+    def __init__(self, id, sender_id, content, content_bin, timestamp, status):
+        self.id = id
+        self.sender_id = sender_id
+        self.content = content
+        self.content_bin = content_bin
+        self.timestamp = timestamp
+        self.status = status
+
+    @classmethod
+    def from_message(cls, msg):
+        return cls(msg.id, msg.sender_id, msg.content, msg.content_bin, msg.timestamp, msg.status)
+
+    @property
+    def size(self) -> int:
+        body = self.content_bin if self.content_bin is not None else (self.content or "")
+        return len(body) + ENTRY_OVERHEAD
+
+
+class ConversationCache:
+    def __init__(self, tail: int = MESSAGE_CACHE_TAIL, max_bytes: int = MESSAGE_CACHE_BYTES):
+        self.tail = tail
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self._tails: OrderedDict = OrderedDict()
+        # Write counters bucketed by conversation, so a fill that raced with a
+        # send or a status change can be detected without tracking every pair
+        # ever seen.
+        self._writes = [0] * WRITE_SLOTS
+
+    @staticmethod
+    def key(username: str, other: str) -> tuple[str, str]:
+        return (username, other) if username <= other else (other, username)
+
+    def get(self, username: str, other: str, limit: int):
+        key = self.key(username, other)
+        entries = self._tails.get(key)
+        if entries is None:
+            return None
+        self._tails.move_to_end(key)
+        return list(entries)[-limit:]
+
+    def version(self, username: str, other: str) -> int:
+        return self._writes[hash(self.key(username, other)) % WRITE_SLOTS]
+
+    # Replaces the tail with the newest messages loaded from the database,
+    # which must be the complete most recent slice of the conversation. The
+    # fill is skipped if a message was sent or marked seen since ``version``
+    # was taken.
+    def fill(self, username: str, other: str, messages, version: int):
+        key = self.key(username, other)
+        if self._writes[hash(key) % WRITE_SLOTS] != version:
+            return
+        self._drop(key)
+        entries = deque(maxlen=self.tail)
+        for msg in sorted(messages, key=lambda m: m.id)[-self.tail:]:
+            entry = CachedMessage.from_message(msg)
+            entries.append(entry)
+            self.used_bytes += entry.size
+        self._tails[key] = entries
+        self._evict()
+
+    # Only conversations already cached are extended; a new pair is loaded
+    # on its first read.
+    def append(self, username: str, other: str, msg):
+        key = self.key(username, other)
+        self._writes[hash(key) % WRITE_SLOTS] += 1
+        entries = self._tails.get(key)
+        if entries is None:
+            return
+        entry = CachedMessage.from_message(msg)
+        if len(entries) == entries.maxlen:
+            self.used_bytes -= entries[0].size
+        entries.append(entry)
+        self.used_bytes += entry.size
+        if len(entries) > 1 and entries[-2].id > entry.id:
+            ordered = sorted(entries, key=lambda m: m.id)
+            entries.clear()
+            entries.extend(ordered)
+        self._tails.move_to_end(key)
+        self._evict()
+
+    # Bumps the counter even when nothing is cached, so a read that loaded
+    # the old statuses does not store them.
+    def mark_seen(self, username: str, other: str, sender_id: int):
+        key = self.key(username, other)
+        self._writes[hash(key) % WRITE_SLOTS] += 1
+        entries = self._tails.get(key)
+        if entries is None:
+            return
+        for entry in entries:
+            if entry.sender_id == sender_id and entry.status == "sent":
+                entry.status = "seen"
+
+    def _drop(self, key):
+        entries = self._tails.pop(key, None)
+        if entries is not None:
+            self.used_bytes -= sum(entry.size for entry in entries)
+
+    def _evict(self):
+        while self.used_bytes > self.max_bytes and self._tails:
+            key = next(iter(self._tails))
+            self._drop(key)
+
+
+message_cache = ConversationCache()
@@ -0,0 +1,95 @@
+# backend/message_pipeline.py
+import asyncio
+import os
+from typing import Optional
+
+from backend.db import async_session
+from backend.message_store import insert_messages
+
+# Opt-in group commit for message sends: concurrent inserts are queued and
+# written as one multi-row INSERT per transaction.
+MESSAGE_BATCHING = os.getenv("MESSAGE_BATCHING", "false").lower() in ("1", "true", "yes")
+MESSAGE_FLUSH_MS = float(os.getenv("MESSAGE_FLUSH_MS", "5"))
+MESSAGE_BATCH_SIZE = int(os.getenv("MESSAGE_BATCH_SIZE", "100"))
+
+
+class MessagePipeline:
+    def __init__(self, session_factory=async_session, flush_ms: float = MESSAGE_FLUSH_MS, batch_size: int = MESSAGE_BATCH_SIZE,
+                 shard: int = 0, shards: int = 1):
+        self.session_factory = session_factory
+        self.shard = shard
+        self.shards = shards
+        self.flush_interval = flush_ms / 1000
+        self.batch_size = batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            # Sends still queued for a worker that died are handed to the
+            # new one rather than left waiting forever.
+            old_queue, self._queue = self._queue, asyncio.Queue()
+            while old_queue is not None and not old_queue.empty():
+                item = old_queue.get_nowait()
+                if item is not None:
+                    self._queue.put_nowait(item)
+            self._worker = asyncio.create_task(self._run())
+
+    async def submit(self, values: dict) -> int:
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((values, future))
+        return await future
+
+    async def _run(self):
+        batch = []
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is None:
+                    return
+                batch = [item]
+                deadline = asyncio.get_running_loop().time() + self.flush_interval
+                stop = False
+                while len(batch) < self.batch_size:
+                    timeout = deadline - asyncio.get_running_loop().time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                await self._flush(batch)
+                if stop:
+                    return
+        finally:
+            # A worker cancelled mid-batch fails the sends it had taken.
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Message pipeline stopped"))
+
+    async def _flush(self, batch):
+        try:
+            async with self.session_factory() as db:
+                ids = await insert_messages(db, [values for values, _ in batch], self.shard, self.shards)
+                await db.commit()
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), message_id in zip(batch, ids):
+            if not future.done():
+                future.set_result(message_id)
+
+    async def close(self):
+        if self._worker is None or self._worker.done():
+            return
+        await self._queue.put(None)
+        await self._worker
+        self._worker = None
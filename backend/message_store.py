@@ -0,0 +1,88 @@
+# backend/message_store.py
+from typing import Optional
+
+from sqlalchemy import case, func, insert, select, text
+
+from backend.conversations import record_messages
+from backend.models.message import Message, message_change_seq
+
+
+# SQLite shards have no sequences; their writes are serialized anyway. On
+# PostgreSQL the writer takes its transaction id before the value, which
+# ChangeHorizon relies on.
+def next_change_seq(db):
+    if db.get_bind().dialect.name == "sqlite":
+        return select(func.coalesce(func.max(Message.change_seq), 0) + 1).scalar_subquery()
+    return case((func.pg_current_xact_id().is_not(None), message_change_seq.next_value()))
+
+
+# Message ids are interleaved across shards (shard i numbers i+1, i+1+n,
+# ...) so they stay unique everywhere. PostgreSQL shards get this from
+# their id sequence (see init_shards); SQLite shards from this expression.
+def next_message_id(shard: int, shards: int):
+    return select(func.coalesce(func.max(Message.id) + shards, shard + 1)).scalar_subquery()
+
+
+# Inserts message rows (dicts of column values) with their change_seq and
+# records them in the conversations table, inside the caller's transaction.
+# Returns the new ids in row order.
+async def insert_messages(db, rows, shard: int = 0, shards: int = 1) -> list:
+    stmt = insert(Message).values(change_seq=next_change_seq(db))
+    if db.get_bind().dialect.name == "sqlite":
+        if shards > 1:
+            stmt = stmt.values(id=next_message_id(shard, shards))
+        # One statement per row, so each row's max() sees the rows before it.
+        ids = [await db.scalar(stmt.values(**row).returning(Message.id)) for row in rows]
+    else:
+        result = await db.execute(stmt.returning(Message.id, sort_by_parameter_order=True), rows)
+        ids = result.scalars().all()
+    await record_messages(db, [
+        (message_id, row["sender_id"], row["receiver_id"], row["timestamp"])
+        for row, message_id in zip(rows, ids)
+    ])
+    return ids
+
+
+# PostgreSQL hands out change_seq values when rows are written, not in
+# commit order, so a transaction can commit a lower value after a reader has
+# moved past it. Sync only reads up to a horizon no open transaction can
+# still fill in: the sequence's last value, read before a snapshot with xmax
+# X, is safe once every transaction below X has ended. Horizons that are not
+# safe yet are retried on later calls, so under steady writes the horizon
+# trails a little instead of stalling; a long-open write transaction holds
+# it back until it ends.
+class ChangeHorizon:
+    MAX_PENDING = 64
+
+    def __init__(self):
+        self.safe = 0
+        # (last change_seq, snapshot xmax) pairs not yet known to be safe.
+        self._pending = []
+
+    async def get(self, db) -> int:
+        last = await db.scalar(text(
+            "SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM message_change_seq"
+        ))
+        xmax = await db.scalar(text("SELECT pg_snapshot_xmax(pg_current_snapshot())::text::bigint"))
+        # A new statement, so a new snapshot.
+        xmin = await db.scalar(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"))
+        pending = []
+        for candidate, candidate_xmax in [*self._pending, (last, xmax)]:
+            if candidate_xmax <= xmin:
+                self.safe = max(self.safe, candidate)
+            else:
+                pending.append((candidate, candidate_xmax))
+        self._pending = pending[:self.MAX_PENDING]
+        return self.safe
+
+
+change_horizons = {}
+
+
+# Highest change_seq sync may return from this database, or None when
+# values always commit in order (SQLite serializes its writers).
+async def change_horizon(db) -> Optional[int]:
+    bind = db.get_bind()
+    if bind.dialect.name == "sqlite":
+        return None
+    return await change_horizons.setdefault(bind, ChangeHorizon()).get(db)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, CheckConstraint, UniqueConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, CheckConstraint, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from backend.db import Base
@@ -11,6 +11,8 @@ class GroupMember(Base):
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     status = Column(String, nullable=False)  # 'joined', 'invited', 'pending'
     joined_at = Column(DateTime, default=datetime.utcnow)
+    # Highest group message id this member has read.
+    last_read_message_id = Column(Integer, nullable=False, default=0, server_default="0")
 
     group = relationship("Group", back_populates="members")
     user = relationship("User", backref="group_memberships")
@@ -18,4 +20,6 @@ class GroupMember(Base):
     __table_args__ = (
         UniqueConstraint("group_id", "user_id", name="unique_member_per_group"),
         CheckConstraint("status IN ('joined', 'invited', 'pending')", name="valid_member_status"),
+        Index("ix_group_members_user_status", "user_id", "status"),
+        Index("ix_group_members_group_status", "group_id", "status", "id"),
     )
\ No newline at end of file
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, UniqueConstraint, CheckConstraint, Index
+from backend.db import Base
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+    id = Column(Integer, primary_key=True, index=True)
+    # The pair is stored ordered (user_a_id < user_b_id) so it has one row.
+    user_a_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_b_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Not a foreign key: the partitioned messages table has no unique index
+    # on id alone, and archived messages leave the table.
+    last_message_id = Column(Integer, nullable=True)
+    last_message_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_a_id", "user_b_id", name="unique_conversation_pair"),
+        CheckConstraint("user_a_id <= user_b_id", name="ordered_conversation_pair"),
+        Index("ix_conversations_user_a_recent", "user_a_id", "last_message_at", "id"),
+        Index("ix_conversations_user_b_recent", "user_b_id", "last_message_at", "id"),
+    )
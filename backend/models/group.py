@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, CheckConstraint, UniqueConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, CheckConstraint, UniqueConstraint, Index, DDL, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from backend.db import Base
@@ -8,8 +8,23 @@ class Group(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
-    creator_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    creator_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     creator = relationship("User", backref="created_groups")
-    members = relationship("GroupMember", back_populates="group", cascade="all, delete-orphan")
\ No newline at end of file
+    # Members are removed by the database's ON DELETE CASCADE, never loaded
+    # just to be deleted.
+    members = relationship("GroupMember", back_populates="group", cascade="all, delete-orphan", passive_deletes=True)
+
+
+# The catalog pages through groups by name in byte order, so a name prefix
+# is one contiguous range of this index whatever the database collation.
+Index("ix_groups_name_c_id", Group.name.collate("C"), Group.id).ddl_if(dialect="postgresql")
+# SQLite already compares in byte order. Its index is created with the table
+# rather than declared on the metadata, so the PostgreSQL drift check does
+# not expect it.
+event.listen(
+    Group.__table__,
+    "after_create",
+    DDL("CREATE INDEX IF NOT EXISTS ix_groups_name_id ON groups (name, id)").execute_if(dialect="sqlite"),
+)
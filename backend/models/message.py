@@ -1,13 +1,28 @@
 # app/models/message.py
-from sqlalchemy import Column, Integer, ForeignKey, String, DateTime
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey, String, DateTime, LargeBinary, Sequence, Index
 from datetime import datetime
 from backend.db import Base
 
+# Bumped on insert and on every status change; clients sync from the highest
+# value they have seen.
+message_change_seq = Sequence("message_change_seq")
+
+# In PostgreSQL the table is range-partitioned by month on ``timestamp`` (see
+# the migrations); old partitions are moved into MessageArchive.
 class Message(Base):
     __tablename__ = "messages"
     id = Column(Integer, primary_key=True, index=True)
     sender_id = Column(Integer, ForeignKey("users.id"))
     receiver_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     content = Column(String)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    content_bin = Column(LargeBinary, nullable=True)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
     status = Column(String, default="sent")
+    change_seq = Column(BigInteger, message_change_seq, nullable=True)
+
+    __table_args__ = (
+        Index("ix_messages_receiver_status_sender", "receiver_id", "status", "sender_id"),
+        Index("ix_messages_sender_receiver_timestamp", "sender_id", "receiver_id", "timestamp"),
+        Index("ix_messages_receiver_change_seq", "receiver_id", "change_seq"),
+        Index("ix_messages_sender_change_seq", "sender_id", "change_seq"),
+    )
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, LargeBinary, DateTime, Index
+from datetime import datetime
+from backend.db import Base
+
+class MessageArchive(Base):
+    __tablename__ = "message_archive"
+    id = Column(Integer, primary_key=True, index=True)
+    # Ordered pair, as in Conversation.
+    user_a_id = Column(Integer, nullable=False)
+    user_b_id = Column(Integer, nullable=False)
+    first_message_id = Column(Integer, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    # zlib-compressed msgpack list of message rows, oldest first.
+    payload = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_message_archive_pair_last_id", "user_a_id", "user_b_id", "last_message_id"),
+    )
@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
 from datetime import datetime
 from backend.db import Base
 
 class Participant(Base):
     __tablename__ = "participants"
     id = Column(Integer, primary_key=True, index=True)
-    call_id = Column(String, ForeignKey("call_session.id"))
+    call_id = Column(String, ForeignKey("call_session.id", ondelete="CASCADE"))
     user_id = Column(String, index=True)
     joined_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("call_id", "user_id", name="unique_participant_per_call"),
+    )
@@ -9,5 +9,5 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=True)
     public_key = Column(String, nullable=True)
     email_confirmed = Column(Boolean, default=False)
-    confirmation_token = Column(String, nullable=True)
+    confirmation_token = Column(String, nullable=True, index=True)
     status = Column(String(20), default="available")
@@ -0,0 +1,207 @@
+# backend/profiling.py
+import asyncio
+import hmac
+import html
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+# On-demand sampling profiler for single requests. While a request is
+# profiled a background thread samples the event loop thread every few
+# milliseconds: when the request's task is running its stack is recorded,
+# and while it is suspended the chain of coroutines it is awaiting is, so
+# time spent waiting on the database shows up under the query that waits.
+# Nothing is installed into the interpreter, so requests that are not
+# profiled only pay for a header lookup.
+PROFILING = os.getenv("PROFILING", "false").lower() in ("1", "true", "yes")
+# Requests carrying "X-Profile: <PROFILE_TOKEN>" are profiled; without a
+# token only sampling applies.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+# Fraction of all other requests that are profiled.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/webrtc-profiles")
+# The sampler stops by itself after this long, whatever the request does.
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+
+PROFILE_HEADER = b"x-profile"
+EXEMPT_PREFIXES = ("/events/",)
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id: int, task: asyncio.Task = None, interval_ms: float = PROFILE_INTERVAL_MS,
+                 max_seconds: float = PROFILE_MAX_SECONDS):
+        self.thread_id = thread_id
+        self.task = task
+        self.interval = interval_ms / 1000
+        self.max_seconds = max_seconds
+        # "outer;...;inner" -> number of samples.
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._sample(frame)] += 1
+
+    def _sample(self, frame) -> str:
+        frames = thread_stack(frame)
+        task_frame = self.task.get_coro().cr_frame if self.task is not None else None
+        if task_frame is None or task_frame in frames:
+            return ";".join(frame_label(frame) for frame in frames)
+        return ";".join(["(awaiting)", *(frame_label(frame) for frame in await_chain(self.task.get_coro()))])
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+# Frames of a thread, outermost first.
+def thread_stack(frame) -> list:
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+# Frames of a suspended coroutine and of everything it awaits, outermost
+# first; the chain ends at the coroutine waiting on a future or I/O.
+def await_chain(coro) -> list:
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frames
+
+
+# Brendan Gregg's collapsed format, readable by flamegraph.pl, speedscope
+# and most other flame graph tools.
+def format_collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def _stack_tree(stacks: Counter) -> dict:
+    root = {"count": 0, "children": {}}
+    for stack, count in stacks.items():
+        root["count"] += count
+        node = root
+        for label in stack.split(";"):
+            node = node["children"].setdefault(label, {"count": 0, "children": {}})
+            node["count"] += count
+    return root
+
+
+def _render_node(label: str, node: dict, parent_count: int, total: int, out: list):
+    width = 100 * node["count"] / parent_count
+    share = 100 * node["count"] / total
+    title = html.escape(f"{label} — {node['count']} samples, {share:.1f}%")
+    out.append(f'<div class="n" style="width:{width:.4f}%"><div class="f" title="{title}">{html.escape(label)}</div>')
+    if node["children"]:
+        out.append('<div class="c">')
+        for child_label, child in sorted(node["children"].items(), key=lambda item: -item[1]["count"]):
+            _render_node(child_label, child, node["count"], total, out)
+        out.append("</div>")
+    out.append("</div>")
+
+
+# A self-contained icicle graph: callers on top, each frame as wide as its
+# share of the samples. Hovering a frame shows its sample count.
+def format_flamegraph(stacks: Counter, title: str) -> str:
+    root = _stack_tree(stacks)
+    out = [
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">",
+        f"<title>{html.escape(title)}</title><style>",
+        "body{font:12px monospace;margin:8px}",
+        ".c{display:flex}",
+        ".n{box-sizing:border-box;overflow:hidden}",
+        ".f{background:#f4a259;border:1px solid #fff;padding:1px 2px;white-space:nowrap;overflow:hidden;text-overflow:ellipsis}",
+        ".f:hover{background:#e76f51}",
+        "</style></head><body>",
+        f"<h3>{html.escape(title)} — {root['count']} samples</h3><div class=\"c\">",
+    ]
+    if root["count"]:
+        for label, node in sorted(root["children"].items(), key=lambda item: -item[1]["count"]):
+            _render_node(label, node, root["count"], root["count"], out)
+    out.append("</div></body></html>\n")
+    return "".join(out)
+
+
+def write_profile(stacks: Counter, directory: str, name: str, title: str):
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, name)
+    with open(f"{base}.collapsed", "w") as f:
+        f.write(format_collapsed(stacks))
+    with open(f"{base}.html", "w") as f:
+        f.write(format_flamegraph(stacks, title))
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, token: str = PROFILE_TOKEN, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 directory: str = PROFILE_DIR):
+        self.app = app
+        self.token = token.encode()
+        self.sample_rate = sample_rate
+        self.directory = directory
+        # One request is profiled at a time, so the overhead stays bounded
+        # and stacks from the shared event loop are not double-counted.
+        self._active = False
+
+    def _wanted(self, scope) -> bool:
+        if self._active or scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            return False
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not PROFILING or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = "{}-{}-{}-{}{}".format(
+            time.strftime("%Y%m%d-%H%M%S"),
+            os.getpid(),
+            uuid.uuid4().hex[:6],
+            scope["method"].lower(),
+            re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).rstrip("_"),
+        )
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", name.encode())]
+            await send(message)
+
+        self._active = True
+        profiler = SamplingProfiler(threading.get_ident(), asyncio.current_task())
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            stacks = profiler.stop()
+            self._active = False
+            title = f"{scope['method']} {scope['path']}"
+            await asyncio.to_thread(write_profile, stacks, self.directory, name, title)
@@ -0,0 +1,184 @@
+# backend/pubsub.py
+import asyncio
+import fcntl
+import json
+import os
+import struct
+from typing import Callable
+
+# "local" delivers within this process only. "unix" connects every worker
+# on the host through a broker on a Unix domain socket; the first worker to
+# take the lock file runs the broker and another takes over if it exits.
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "local")
+PUBSUB_SOCKET = os.getenv("PUBSUB_SOCKET", "/tmp/webrtc-pubsub.sock")
+
+# Messages travel as a 4-byte big-endian length followed by the JSON body.
+# Larger messages are refused by publish(); a peer that sends one anyway has
+# it skipped, not its connection dropped.
+MAX_MESSAGE = 1024 * 1024
+HEADER = struct.Struct(">I")
+# A worker whose unsent backlog grows past this is disconnected; it
+# reconnects and clients resync through their replay buffers.
+MAX_PEER_BUFFER = 8 * 1024 * 1024
+RECONNECT_DELAY = 0.5
+
+
+class LocalPubSub:
+    def __init__(self):
+        self._handlers: list[tuple[str, Callable]] = []
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    # ``handler(channel, data)`` is called for every message on a channel
+    # starting with ``prefix``, such as "user:" or "call:<id>".
+    def subscribe(self, prefix: str, handler: Callable):
+        self._handlers.append((prefix, handler))
+
+    def unsubscribe(self, prefix: str, handler: Callable):
+        self._handlers.remove((prefix, handler))
+
+    # Delivers locally right away and never waits on other workers.
+    def publish(self, channel: str, data: dict):
+        self._dispatch(channel, data)
+
+    def _dispatch(self, channel: str, data: dict):
+        for prefix, handler in list(self._handlers):
+            if channel.startswith(prefix):
+                handler(channel, data)
+
+
+class UnixSocketPubSub(LocalPubSub):
+    def __init__(self, path: str = PUBSUB_SOCKET):
+        super().__init__()
+        self.path = path
+        self._lock_file = None
+        self._server = None
+        self._peers: set = set()
+        self._upstream = None
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for writer in list(self._peers):
+            writer.close()
+        if self._server is not None:
+            self._server.close()
+            os.unlink(self.path)
+            self._server = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def publish(self, channel: str, data: dict):
+        body = json.dumps({"channel": channel, "data": data}, default=str).encode()
+        if len(body) > MAX_MESSAGE:
+            raise ValueError(f"Message on {channel!r} is {len(body)} bytes, over the {MAX_MESSAGE} byte limit")
+        self._dispatch(channel, data)
+        frame = HEADER.pack(len(body)) + body
+        if self._server is not None:
+            self._forward(frame, None)
+        elif self._upstream is not None:
+            self._upstream.write(frame)
+
+    async def _run(self):
+        while True:
+            if self._take_lock():
+                await self._serve()
+                return
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            self._upstream = writer
+            try:
+                await self._read(reader, None)
+            finally:
+                self._upstream = None
+                writer.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    # The lock is held until the process exits, so a crashed broker frees it.
+    def _take_lock(self) -> bool:
+        lock_file = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _serve(self):
+        # Holding the lock means any existing socket file is stale.
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._accept, self.path)
+        await self._server.serve_forever()
+
+    async def _accept(self, reader, writer):
+        self._peers.add(writer)
+        try:
+            await self._read(reader, writer)
+        except asyncio.CancelledError:
+            # The broker is shutting down; the peer reconnects elsewhere.
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _read(self, reader, source):
+        while True:
+            try:
+                header = await reader.readexactly(HEADER.size)
+                (size,) = HEADER.unpack(header)
+                if size > MAX_MESSAGE:
+                    await skip(reader, size)
+                    continue
+                body = await reader.readexactly(size)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                return
+            message = json.loads(body)
+            if source is not None:
+                self._forward(header + body, source)
+            self._dispatch(message["channel"], message["data"])
+
+    def _forward(self, frame: bytes, source):
+        for writer in list(self._peers):
+            if writer is source:
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_PEER_BUFFER:
+                self._peers.discard(writer)
+                writer.close()
+                continue
+            writer.write(frame)
+
+
+async def skip(reader, size: int):
+    while size:
+        size -= len(await reader.readexactly(min(size, MAX_MESSAGE)))
+
+
+def create_pubsub(backend: str = PUBSUB_BACKEND):
+    if backend == "unix":
+        return UnixSocketPubSub()
+    if backend == "local":
+        return LocalPubSub()
+    raise ValueError(f"Unknown PUBSUB_BACKEND {backend!r}")
+
+
+pubsub = create_pubsub()
@@ -0,0 +1,92 @@
+# backend/rate_limit.py
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from jose import JWTError, jwt
+
+from backend.auth import ALGORITHM, SECRET_KEY
+
+RATE_LIMIT = os.getenv("RATE_LIMIT", "true").lower() in ("1", "true", "yes")
+# Hard cap on buckets per limiter; idle buckets are evicted long before.
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate: float, burst: int, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.rate = rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        # key -> [tokens, last update], least recently used first.
+        self._buckets: OrderedDict = OrderedDict()
+        # A bucket untouched this long has refilled completely, so dropping
+        # it changes nothing.
+        self._idle_after = burst / rate
+
+    # Takes one token for ``key``; returns None when allowed, otherwise the
+    # seconds until a token is available.
+    def acquire(self, key, now: Optional[float] = None) -> Optional[float]:
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now]
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            return (1 - bucket[0]) / self.rate
+        bucket[0] -= 1
+        return None
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _evict(self, now: float):
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < self._idle_after and len(self._buckets) < self.max_buckets:
+                return
+            del self._buckets[key]
+
+
+# Identifies the caller from the bearer token without a database query;
+# unauthenticated requests share a bucket per client address.
+def request_identity(request: Request) -> str:
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            username = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except JWTError:
+            username = None
+        if username:
+            return f"user:{username}"
+    return f"addr:{request.client.host if request.client else ''}"
+
+
+# Router dependency. Limits are set per router with
+# RATE_LIMIT_<NAME>_RATE (tokens per second) and RATE_LIMIT_<NAME>_BURST.
+class RateLimit:
+    def __init__(self, name: str, rate: float, burst: int):
+        prefix = f"RATE_LIMIT_{name.upper()}"
+        self.name = name
+        self.limiter = TokenBucketLimiter(
+            float(os.getenv(f"{prefix}_RATE", str(rate))),
+            int(os.getenv(f"{prefix}_BURST", str(burst))),
+        )
+
+    async def __call__(self, request: Request):
+        if not RATE_LIMIT:
+            return
+        retry_after = self.limiter.acquire(request_identity(request))
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
@@ -16,4 +16,9 @@ class GroupMemberRead(BaseModel):
 
 
 class GroupMemberUpdate(BaseModel):
-    user_id: int
\ No newline at end of file
+    user_id: int
+
+
+class GroupBulkInviteRequest(BaseModel):
+    user_ids: List[int] = Field(default_factory=list, max_length=500)
+    usernames: List[str] = Field(default_factory=list, max_length=500)
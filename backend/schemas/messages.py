@@ -1,5 +1,13 @@
-from pydantic import BaseModel
+from typing import List
+
+from pydantic import BaseModel, Field
 
 class MessageSendRequest(BaseModel):
     to: str
     encrypted_content: str
+
+class MessageBatchSendRequest(BaseModel):
+    messages: List[MessageSendRequest] = Field(..., min_length=1, max_length=500)
+
+class GroupMessageSendRequest(BaseModel):
+    encrypted_content: str
@@ -0,0 +1,113 @@
+# backend/sharding.py
+import asyncio
+import os
+import zlib
+from contextlib import asynccontextmanager
+
+from sqlalchemy import MetaData, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+
+from backend.conversations import conversation_pair
+from backend.db import async_session, enable_sqlite_foreign_keys, engine
+from backend.message_archive import create_partitioned_messages
+from backend.message_pipeline import MessagePipeline
+from backend.models.conversation import Conversation
+from backend.models.message import Message
+from backend.models.message_archive import MessageArchive
+
+# Comma-separated database URLs that hold the message tables. When unset,
+# messages stay on the primary database as a single shard.
+MESSAGE_SHARD_URLS = [url.strip() for url in os.getenv("MESSAGE_SHARD_URLS", "").split(",") if url.strip()]
+
+SHARDED_TABLES = [Message.__table__, Conversation.__table__, MessageArchive.__table__]
+
+
+class ShardRouter:
+    def __init__(self, urls):
+        self.sharded = bool(urls)
+        if self.sharded:
+            self.engines = [create_async_engine(url, echo=engine.echo) for url in urls]
+            for shard_engine in self.engines:
+                enable_sqlite_foreign_keys(shard_engine)
+            self.sessionmakers = [
+                async_sessionmaker(shard_engine, expire_on_commit=False, class_=AsyncSession)
+                for shard_engine in self.engines
+            ]
+        else:
+            self.engines = [engine]
+            self.sessionmakers = [async_session]
+        self.pipelines = [
+            MessagePipeline(sessionmaker, shard=index, shards=len(self.sessionmakers))
+            for index, sessionmaker in enumerate(self.sessionmakers)
+        ]
+
+    def __len__(self):
+        return len(self.engines)
+
+    # Both directions of a conversation hash to the same shard.
+    def shard_for(self, user_id: int, other_id: int) -> int:
+        user_a_id, user_b_id = conversation_pair(user_id, other_id)
+        return zlib.crc32(f"{user_a_id}:{user_b_id}".encode()) % len(self.engines)
+
+    # Without sharding the request's own session is reused, so single-database
+    # deployments keep one connection per request.
+    @asynccontextmanager
+    async def session(self, db, index: int):
+        if not self.sharded:
+            yield db
+            return
+        async with self.sessionmakers[index]() as shard_db:
+            yield shard_db
+
+    def for_pair(self, db, user_id: int, other_id: int):
+        return self.session(db, self.shard_for(user_id, other_id))
+
+    def pipeline_for(self, user_id: int, other_id: int) -> MessagePipeline:
+        return self.pipelines[self.shard_for(user_id, other_id)]
+
+    # Runs ``query(shard_db)`` on every shard concurrently and returns the
+    # results in shard order.
+    async def gather(self, db, query):
+        async def run(index):
+            async with self.session(db, index) as shard_db:
+                return await query(shard_db)
+        return await asyncio.gather(*(run(index) for index in range(len(self.engines))))
+
+
+# Shards hold no users table, so the message tables are created without
+# their foreign keys.
+def shard_metadata() -> MetaData:
+    metadata = MetaData()
+    for table in SHARDED_TABLES:
+        shard_table = table.to_metadata(metadata)
+        for constraint in list(shard_table.foreign_key_constraints):
+            shard_table.constraints.discard(constraint)
+        for column in shard_table.columns:
+            column.foreign_keys.clear()
+        shard_table.foreign_keys.clear()
+    return metadata
+
+
+# On PostgreSQL messages is partitioned by month like on the primary, so
+# archive_messages.py works on every shard.
+async def init_shards(router: "ShardRouter"):
+    metadata = shard_metadata()
+    for index, shard_engine in enumerate(router.engines):
+        async with shard_engine.begin() as conn:
+            if conn.dialect.name != "postgresql":
+                await conn.run_sync(metadata.create_all)
+                continue
+            await create_partitioned_messages(conn)
+            tables = [table for table in metadata.sorted_tables if table.name != "messages"]
+            await conn.run_sync(metadata.create_all, tables=tables)
+            # Interleave message ids so they stay unique across shards; only
+            # done while the sequence is still unused.
+            result = await conn.execute(text("SELECT is_called FROM messages_id_seq"))
+            if not result.scalar():
+                await conn.execute(text(
+                    f"ALTER SEQUENCE messages_id_seq INCREMENT BY {len(router)} "
+                    f"START WITH {index + 1} RESTART WITH {index + 1}"
+                ))
+
+
+message_shards = ShardRouter(MESSAGE_SHARD_URLS)
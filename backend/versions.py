@@ -0,0 +1,66 @@
+# backend/versions.py
+import os
+import uuid
+from typing import Optional
+
+from fastapi import Request, Response
+
+from backend.pubsub import PUBSUB_BACKEND, pubsub as default_pubsub
+
+# Change counters behind the ETags of polled endpoints. Counters live in a
+# fixed number of slots hashed by resource, so memory stays constant; two
+# resources sharing a slot only cost each other a spurious 200.
+VERSION_SLOTS = int(os.getenv("VERSION_SLOTS", "65536"))
+# With the "local" pub/sub backend a worker never sees other workers'
+# bumps and would keep answering 304 after their changes, so ETags are only
+# issued when bumps are shared or a single worker runs (WEB_CONCURRENCY is
+# uvicorn's default --workers).
+ETAGS = os.getenv(
+    "ETAGS",
+    str(PUBSUB_BACKEND != "local" or int(os.getenv("WEB_CONCURRENCY", "1")) <= 1),
+).lower() in ("1", "true", "yes")
+
+
+class ResourceVersions:
+    def __init__(self, pubsub=default_pubsub, slots: int = VERSION_SLOTS, enabled: bool = ETAGS):
+        self.pubsub = pubsub
+        self.enabled = enabled
+        self._slots = [0] * slots
+        # Counters start over in every process, so ETags carry the process
+        # epoch and a restarted or different worker never answers 304 to an
+        # ETag it did not issue.
+        self._epoch = uuid.uuid4().hex[:8]
+
+    def _slot(self, kind: str, key) -> int:
+        return hash((kind, key)) % len(self._slots)
+
+    def etag(self, kind: str, key) -> str:
+        return f'"{self._epoch}-{self._slots[self._slot(kind, key)]}"'
+
+    # Called by mutating handlers after their commit; other workers bump the
+    # same counters through the pub/sub layer.
+    def bump(self, kind: str, *keys):
+        if keys:
+            self.pubsub.publish(f"version:{kind}", {"keys": list(keys)})
+
+    def receive(self, channel: str, message: dict):
+        kind = channel[len("version:"):]
+        for key in message["keys"]:
+            self._slots[self._slot(kind, key)] += 1
+
+    # Sets the ETag on ``response`` and returns a 304 response when the
+    # client already has the current version. The version must be read
+    # before the data, so a change in between is never hidden.
+    def check(self, request: Request, response: Response, kind: str, key) -> Optional[Response]:
+        if not self.enabled:
+            return None
+        etag = self.etag(kind, key)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return None
+
+
+resource_versions = ResourceVersions()
+default_pubsub.subscribe("version:", resource_versions.receive)
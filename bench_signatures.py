@@ -0,0 +1,67 @@
+# bench_signatures.py
+import base64
+import secrets
+import timeit
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
+
+from backend.api.auth import load_public_key, verify_signature
+
+ROUNDS = 2000
+
+
+def rsa_scheme(bits):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=bits)
+    return private_key, lambda data: private_key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+
+
+def p256_scheme():
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    return private_key, lambda data: private_key.sign(data, ec.ECDSA(hashes.SHA256()))
+
+
+def ed25519_scheme():
+    private_key = ed25519.Ed25519PrivateKey.generate()
+    return private_key, private_key.sign
+
+
+SCHEMES = {
+    "RSA-2048": lambda: rsa_scheme(2048),
+    "RSA-3072": lambda: rsa_scheme(3072),
+    "ECDSA P-256": p256_scheme,
+    "Ed25519": ed25519_scheme,
+}
+
+
+def per_call_us(fn) -> float:
+    return min(timeit.repeat(fn, number=ROUNDS, repeat=3)) / ROUNDS * 1e6
+
+
+# Login verification cost per key type: what a user's stored key weighs,
+# a verification with the parsed key cached, and one that parses the PEM
+# as well (the first login after a restart).
+def main():
+    nonce = secrets.token_hex(16)
+    print(f"{'scheme':<12} {'PEM bytes':>9} {'sig bytes':>9} {'verify µs':>10} {'+parse µs':>10}")
+    for name, make in SCHEMES.items():
+        private_key, sign = make()
+        pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        signature = sign(nonce.encode())
+        signature_b64 = base64.b64encode(signature).decode()
+        assert verify_signature(pem, nonce, signature_b64)
+
+        cached = per_call_us(lambda: verify_signature(pem, nonce, signature_b64))
+
+        def uncached():
+            load_public_key.cache_clear()
+            verify_signature(pem, nonce, signature_b64)
+
+        parsed = per_call_us(uncached)
+        print(f"{name:<12} {len(pem):>9} {len(signature):>9} {cached:>10.1f} {parsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
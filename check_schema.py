@@ -0,0 +1,51 @@
+# check_schema.py
+import asyncio
+import sys
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+
+from backend.db import engine, Base
+import backend.models.user
+import backend.models.call_session
+import backend.models.participant
+import backend.models.signaling
+import backend.models.message
+import backend.models.message_archive
+import backend.models.conversation
+import backend.models.group
+import backend.models.GroupMember
+import backend.models.group_message
+
+from sqlalchemy import text
+
+# Partitions of messages (messages_legacy, messages_YYYY_MM, ...) reflect as
+# ordinary tables with no model; only the partitioned parent is compared.
+def partition_names(connection):
+    if connection.dialect.name != "postgresql":
+        return set()
+    return set(connection.execute(text("SELECT relname FROM pg_class WHERE relispartition")).scalars())
+
+def diff_schema(connection):
+    partitions = partition_names(connection)
+
+    def include_name(name, type_, parent_names):
+        if type_ == "table":
+            return name not in partitions
+        return True
+
+    context = MigrationContext.configure(connection, opts={"compare_type": True, "include_name": include_name})
+    return compare_metadata(context, Base.metadata)
+
+async def check_schema():
+    async with engine.connect() as conn:
+        return await conn.run_sync(diff_schema)
+
+if __name__ == "__main__":
+    diffs = asyncio.run(check_schema())
+    if diffs:
+        print("❌  Models and database schema differ:")
+        for diff in diffs:
+            print("   ", diff)
+        sys.exit(1)
+    print("✅  Schema matches the models.")
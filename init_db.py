@@ -1,18 +1,17 @@
 # init_db.py
 import asyncio
 
-from backend.db import engine, Base
-import backend.models.user
-import backend.models.call_session
-import backend.models.participant
-import backend.models.signaling
-import backend.models.message
+from alembic import command
+from alembic.config import Config
 
-async def init_models():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+from backend.sharding import init_shards, message_shards
 
 if __name__ == "__main__":
     print("🗄️  Creating tables…")
-    asyncio.run(init_models())
+    # The messages table is range-partitioned by the migrations, which
+    # Base.metadata.create_all cannot express.
+    command.upgrade(Config("alembic.ini"), "head")
+    if message_shards.sharded:
+        print("🗄️  Creating message shards…")
+        asyncio.run(init_shards(message_shards))
     print("✅  Done.")
@@ -1,7 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from backend.api import users, auth, signaling, calls, messages, group
+from backend.api import users, auth, signaling, calls, messages, group, events
+from backend.admission import AdmissionMiddleware
+from backend.profiling import ProfilingMiddleware
+from backend.pubsub import pubsub
+from backend.sharding import message_shards
 
 app = FastAPI()
 
@@ -10,6 +14,9 @@ origins = [
     "http://127.0.0.1:3000"
 ]
 
+# Added before CORS so that CORS wraps it and 503 responses carry its headers.
+app.add_middleware(AdmissionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -18,9 +25,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so a profile covers the whole request, admission included.
+app.add_middleware(ProfilingMiddleware)
+
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(signaling.router)
 app.include_router(calls.router)
 app.include_router(messages.router)
 app.include_router(group.router)
+app.include_router(events.router)
+
+
+@app.on_event("startup")
+async def startup():
+    await pubsub.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await pubsub.close()
+    for pipeline in message_shards.pipelines:
+        await pipeline.close()